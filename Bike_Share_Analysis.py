@@ -64,35 +64,16 @@ import csv # read and write csv files
 from datetime import datetime # operations to parse dates
 from pprint import pprint # use to print data structures like dictionaries in
                           # a nicer way than the base print function.
+from bikeshare.aggregate import Aggregator
+from bikeshare.parallel import condense_parallel
+from bikeshare.histogram import Histogram, histogram, plot_histograms
 
 
 # In[2]:
 
 
-def print_first_point(filename):
-    """
-    This function prints and returns the first data point (second row) from
-    a csv file that includes a header row.
-    """
-    # print city name for reference
-    city = filename.split('-')[0].split('/')[-1]
-    print('\nCity: {}'.format(city))
-    
-    with open(filename, 'r') as f_in:
-        ## TODO: Use the csv library to set up a DictReader object. ##
-        ## see https://docs.python.org/3/library/csv.html           ##
-        trip_reader =csv.DictReader(f_in)
-        
-        ## TODO: Use a function on the DictReader object to read the     ##
-        ## first trip from the data file and store it in a variable.     ##
-        ## see https://docs.python.org/3/library/csv.html#reader-objects ##
-        first_trip = next(trip_reader)
-        
-        ## TODO: Use the pprint library to print the first trip. ##
-        ## see https://docs.python.org/3/library/pprint.html     ##
-        pprint(first_trip)
-    # output city name and first trip for later testing
-    return (city, first_trip)
+# defined in bikeshare/wrangling.py so that it can be reused outside the notebook
+from bikeshare.wrangling import print_first_point
 
 # list of files for each city
 data_files = ['./data/NYC-CitiBike-2016.csv',
@@ -127,29 +108,8 @@ for data_file in data_files:
 # In[3]:
 
 
-def duration_in_mins(datum, city):
-    """
-    Takes as input a dictionary containing info about a single trip (datum) and
-    its origin city (city) and returns the trip duration in units of minutes.
-    
-    Remember that Washington is in terms of milliseconds while Chicago and NYC
-    are in terms of seconds. 
-    
-    HINT: The csv module reads in all of the data as strings, including numeric
-    values. You will need a function to convert the strings into an appropriate
-    numeric type when making your transformations.
-    see https://docs.python.org/3/library/functions.html
-    """
-    
-    # YOUR CODE HERE
-    if city == 'NYC':
-        duration = int(datum['tripduration'])/60
-    elif city == 'Chicago':
-        duration = int(datum['tripduration'])/60
-    else :
-        duration = int(datum['Duration (ms)'])/(60*1000)
-    
-    return duration
+# defined in bikeshare/wrangling.py so that it can be reused outside the notebook
+from bikeshare.wrangling import duration_in_mins
 
 
 # Some tests to check that your code works. There should be no output if all of
@@ -166,38 +126,8 @@ for city in tests:
 # In[4]:
 
 
-def time_of_trip(datum, city):
-    """
-    Takes as input a dictionary containing info about a single trip (datum) and
-    its origin city (city) and returns the month, hour, and day of the week in
-    which the trip was made.
-    
-    Remember that NYC includes seconds, while Washington and Chicago do not.
-    
-    HINT: You should use the datetime module to parse the original date
-    strings into a format that is useful for extracting the desired information.
-    see https://docs.python.org/3/library/datetime.html#strftime-and-strptime-behavior
-    """
-    
-    # YOUR CODE HERE
-    if city == 'NYC' :
-        date = datetime.strptime(datum['starttime'],'%m/%d/%Y %H:%M:%S')
-        month = date.month
-        hour = date.hour
-        day_of_week = date.strftime('%A')
-        
-    elif city == 'Chicago' :
-        date = datetime.strptime(datum['starttime'],'%m/%d/%Y %H:%M')
-        month = date.month
-        hour = date.hour
-        day_of_week = date.strftime('%A')
-    else :
-        date = datetime.strptime(datum['Start date'],'%m/%d/%Y %H:%M')
-        month = date.month
-        hour = date.hour
-        day_of_week = date.strftime('%A')
-        
-    return (month, hour, day_of_week)
+# defined in bikeshare/wrangling.py so that it can be reused outside the notebook
+from bikeshare.wrangling import time_of_trip
 
 
 # Some tests to check that your code works. There should be no output if all of
@@ -214,25 +144,8 @@ for city in tests:
 # In[5]:
 
 
-def type_of_user(datum, city):
-    """
-    Takes as input a dictionary containing info about a single trip (datum) and
-    its origin city (city) and returns the type of system user that made the
-    trip.
-    
-    Remember that Washington has different category names compared to Chicago
-    and NYC. 
-    """
-    
-    # YOUR CODE HERE
-    if city != 'Washington' :
-        user_type = datum['usertype']
-    else :
-        if datum['Member Type'] == 'Registered' :
-            user_type = 'Subscriber'
-        else :
-            user_type = 'Customer'
-    return user_type
+# defined in bikeshare/wrangling.py so that it can be reused outside the notebook
+from bikeshare.wrangling import type_of_user
 
 
 # Some tests to check that your code works. There should be no output if all of
@@ -251,43 +164,9 @@ for city in tests:
 # In[6]:
 
 
-def condense_data(in_file, out_file, city):
-    """
-    This function takes full data from the specified input file
-    and writes the condensed data to a specified output file. The city
-    argument determines how the input file will be parsed.
-    
-    HINT: See the cell below to see how the arguments are structured!
-    """
-    
-    with open(out_file, 'w') as f_out, open(in_file, 'r') as f_in:
-        # set up csv DictWriter object - writer requires column names for the
-        # first row as the "fieldnames" argument
-        out_colnames = ['duration', 'month', 'hour', 'day_of_week', 'user_type']        
-        trip_writer = csv.DictWriter(f_out, fieldnames = out_colnames)
-        trip_writer.writeheader()
-        
-        ## TODO: set up csv DictReader object ##
-        trip_reader = csv.DictReader(f_in)
-
-        # collect data from and process each row
-        for row in trip_reader:
-            # set up a dictionary to hold the values for the cleaned and trimmed
-            # data point
-            new_point = {}
-
-            ## TODO: use the helper functions to get the cleaned data from  ##
-            ## the original data dictionaries.                              ##
-            ## Note that the keys for the new_point dictionary should match ##
-            ## the column names set in the DictWriter object above.         ##
-            new_point['duration']=duration_in_mins(row,city)
-            new_point['month'],new_point['hour'],new_point['day_of_week']=time_of_trip(row,city)
-            new_point['user_type']=type_of_user(row,city)
-
-            ## TODO: write the processed information to the output file.     ##
-            ## see https://docs.python.org/3/library/csv.html#writer-objects ##
-            trip_writer.writerow(new_point)
-            
+# defined in bikeshare/wrangling.py so that it can be reused outside the notebook
+from bikeshare.wrangling import condense_data
+
 
 
 # In[7]:
@@ -301,8 +180,13 @@ city_info = {'Washington': {'in_file': './data/Washington-CapitalBikeshare-2016.
              'NYC': {'in_file': './data/NYC-CitiBike-2016.csv',
                      'out_file': './data/NYC-2016-Summary.csv'}}
 
+# condense_parallel writes exactly the same files as calling condense_data
+# for each city, but converts the trips in chunks with numpy, and splits the
+# cities and their files over several processes. With incremental=True,
+# inputs that haven't changed since the last run are skipped and inputs that
+# only gained new trips have just those condensed.
+condense_parallel(city_info, columnar=True, incremental=True, cube=True)
 for city, filenames in city_info.items():
-    condense_data(filenames['in_file'], filenames['out_file'], city)
     print_first_point(filenames['out_file'])
 
 
@@ -327,33 +211,8 @@ for city, filenames in city_info.items():
 # In[8]:
 
 
-def number_of_trips(filename):
-    """
-    This function reads in a file with trip data and reports the number of
-    trips made by subscribers, customers, and total overall.
-    """
-    with open(filename, 'r') as f_in:
-        # set up csv reader object
-        reader = csv.DictReader(f_in)
-        
-        # initialize count variables
-        n_subscribers = 0
-        n_customers = 0
-        n_trips = 0
-        
-        # tally up ride types
-        for row in reader:
-            n_trips += 1
-            if row['user_type'] == 'Subscriber':
-                n_subscribers += 1
-            else:
-                n_customers += 1
-        
-        # compute total number of rides
-        #n_total = n_subscribers + n_customers
-        
-        # return tallies as a tuple
-        return(n_trips,n_subscribers/n_trips,n_customers/n_trips)
+# defined in bikeshare/stats.py so that it can be reused outside the notebook
+from bikeshare.stats import number_of_trips
 
 
 # In[9]:
@@ -397,32 +256,10 @@ for file in data_file :
 ## TIP: For the Bay Area example, the average trip length is 14 minutes ##
 ## and 3.5% of trips are longer than 30 minutes.                        ##
 
-def func(file):
-    
-    '''
-    this function takes a Bike-share system csv file as input and returns 
-    the average trip length for each city and the proportion of rides 
-    made in each city are longer than 30 minutes
-    '''
-    
-    with open(file) as f :
-        #set up a file reader object
-        reader = csv.DictReader(f)
-        
-        #initialize the variables
-        n_trips = 0
-        sum_of_trip_duration = 0
-        rides_more_than_thirty = 0
-        
-        for row in reader :
-            n_trips += 1
-            sum_of_trip_duration += float(row['duration'])
-            if float(row['duration']) > 30 :
-                rides_more_than_thirty += 1
-        
-    return(int(sum_of_trip_duration/n_trips),float(rides_more_than_thirty*100/n_trips))
-            
-    
+# defined in bikeshare/stats.py so that it can be reused outside the notebook
+from bikeshare.stats import func
+
+
 
 
 # In[11]:
@@ -457,26 +294,8 @@ for file in data_file :
 ## level of difference?   ##
 
 
-def func2(file):
-    with open(file) as f :
-        #set up a file reader object
-        reader = csv.DictReader(f)
-        
-        #initialize the variables
-        n_subs = 0
-        n_cust = 0
-        sum_of_trip_duration_subs = 0
-        sum_of_trip_duration_cust = 0
-        
-        for row in reader :
-            if row['user_type'] == 'Subscriber' :
-                n_subs += 1
-                sum_of_trip_duration_subs += float(row['duration'])
-            else :
-                n_cust += 1
-                sum_of_trip_duration_cust += float(row['duration'])
-        
-        return(sum_of_trip_duration_subs/n_subs,sum_of_trip_duration_cust/n_cust)
+# defined in bikeshare/stats.py so that it can be reused outside the notebook
+from bikeshare.stats import func2
 
 
 # In[13]:
@@ -491,6 +310,31 @@ for file in data_file :
     print('\n')
 
 
+# Means hide a lot about such skewed distributions, so it's worth looking at the median and the high percentiles as well. `duration_quantiles` estimates them with a small mergeable sketch instead of keeping every duration in memory; the cell below checks the estimates for Chicago against the exact percentiles.
+
+# In[ ]:
+
+
+import numpy as np
+from bikeshare.sketch import duration_quantiles
+
+data_file = './data/Chicago-2016-Summary.csv'
+quantiles = duration_quantiles(data_file)
+pprint(quantiles)
+
+# the exact percentiles of the durations as written in the summary
+with open(data_file, 'r') as f_in:
+    durations = [float(row['duration']) for row in csv.DictReader(f_in)]
+
+# each estimate should lie within 1% of the requested quantile (the sketch's
+# typical rank error), i.e. between the exact percentiles either side of it
+for q, value in quantiles['all'].items():
+    low, exact, high = np.percentile(
+        durations, [max(q - .01, 0) * 100, q * 100, min(q + .01, 1) * 100])
+    assert low <= value <= high
+    print(q, value, exact)
+
+
 # <a id='visualizations'></a>
 # ### Visualizations
 # 
@@ -529,29 +373,18 @@ plt.show()
 ## Use this and additional cells to collect all of the trip times as a list ##
 ## and then use pyplot functions to generate a histogram of trip times.     ##
 
-def trip_times(file):
-    
-    '''
-    this function takes a Bike-share system csv file as input and returns 
-    a histogram of the durations of the trips by users
-    ''' 
-    
-    with open(file) as f :
-        reader = csv.DictReader(f)
-        
-        list_of_times = []
-        
-        for row in reader :
-            list_of_times.append(float(row['duration']))
-        
-    return list_of_times
+# defined in bikeshare/stats.py so that it can be reused outside the notebook
+from bikeshare.stats import trip_times
 
 
 # In[16]:
 
 
 data_file='./data/Chicago-2016-Summary.csv'
-plt.hist(trip_times(data_file))
+# histogram() counts the trip times into bins while reading the file instead
+# of collecting them in a list first; the plot is the same as
+# plt.hist(trip_times(data_file))
+plot_histograms([histogram(data_file)])
 plt.xlabel('time')
 plt.title('trip times for Chicago')
 plt.show()
@@ -573,23 +406,8 @@ plt.show()
 
 ## Use this and additional cells to answer Question 5. ##
 
-def trip_times2(file,sub_or_cust):
-    
-    '''
-    this function takes a Bike-share system csv file as input and returns 
-    a histogram of the durations of the trips by users(weather subscribers or customers)
-    ''' 
-    
-    with open(file) as f :
-        reader = csv.DictReader(f)
-        
-        list_of_times = []
-        
-        for row in reader :
-            if row['user_type'] == sub_or_cust :
-                list_of_times.append(float(row['duration']))
-        
-    return list_of_times
+# defined in bikeshare/stats.py so that it can be reused outside the notebook
+from bikeshare.stats import trip_times2
 
 
 # ### the distribution of trip times for the _Customers_ in Chicago###
@@ -598,7 +416,7 @@ def trip_times2(file,sub_or_cust):
 
 
 data_file='./data/Chicago-2016-Summary.csv'
-plt.hist(trip_times2(data_file,'Customer') , range = [0,75] , bins = 15)
+plot_histograms([histogram(data_file, bins = 15, range = [0,75], user_type = 'Customer')])
 plt.xlabel('time')
 plt.title('trip times for Customers in Chicago')
 plt.show()
@@ -610,7 +428,7 @@ plt.show()
 
 
 data_file='./data/Chicago-2016-Summary.csv'
-plt.hist(trip_times2(data_file,'Subscriber') , range = [0,75] , bins = 15)
+plot_histograms([histogram(data_file, bins = 15, range = [0,75], user_type = 'Subscriber')])
 plt.xlabel('time')
 plt.title('trip times for Subscribers Chicago')
 plt.show()
@@ -642,52 +460,23 @@ plt.show()
 ## in the Markdown cell above.                                       ##
 import numpy as np
 
-def analysis(file,user_type = 'all'):
-    
-    '''
-    this function takes a Bike-share system csv file and a type of users as input and returns 
-    a histogram of the ridership for each month (weather all users or subscribers or customers)
-    '''
-    
-    with open(file) as f :
-        
-        #set up file reader
-        reader = csv.DictReader(f)
-        
-        #initialize variables
-        riders_in_each_month = []
-        customer = []
-        subscriber = []
-        
-        
-        for row in reader :
-            
-            riders_in_each_month.append(int(row['month']))
-            if row['user_type'] == 'Customer' :
-                customer.append(int(row['month']))
-            elif row['user_type'] == 'Subscriber' :
-                subscriber.append(int(row['month']))
-     
-    
-    if(user_type == 'all') :      
-        return(riders_in_each_month)
-    elif(user_type == 'customer') :
-        return(customer)
-    elif(user_type == 'subscriber') :
-        return(subscriber)
-            
-            
-            
+# defined in bikeshare/stats.py so that it can be reused outside the notebook
+from bikeshare.stats import analysis
 
 
 # In[22]:
 
 
 data_file='./data/Chicago-2016-Summary.csv'
+# count the months of all users, customers and subscribers in one pass
+agg = Aggregator()
+all_users = agg.add('all', Histogram(np.arange(14), 'month'))
+customers = agg.add('customer', Histogram(np.arange(14), 'month', 'Customer'))
+subscribers = agg.add('subscriber', Histogram(np.arange(14), 'month', 'Subscriber'))
+agg.run(data_file)
 plt.figure(figsize = (12,6))
-plt.hist(x = (analysis(data_file),analysis(data_file,'customer'),analysis(data_file,'subscriber')),
-              bins = np.arange(14) , align = 'left' ,
-              label = ['all users','customers','subscribers'])
+plot_histograms([all_users.result(), customers.result(), subscribers.result()],
+                align = 'left', labels = ['all users','customers','subscribers'])
 plt.legend()
 plt.xticks(range(13))
 plt.xlim([0, 13])
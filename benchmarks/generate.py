@@ -0,0 +1,128 @@
+"""
+Synthetic trip data shaped like the NYC, Chicago and Washington files.
+
+The generated files use the real column names and timestamp layouts, so the
+whole pipeline can be benchmarked at any size without the original data:
+
+    python benchmarks/generate.py --rows 1000000 --out /tmp/bikeshare-bench
+"""
+
+import argparse
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+# columns of each system's 2016 trip files, in order
+CITY_COLUMNS = {
+    'NYC': ['tripduration', 'starttime', 'stoptime', 'start station id',
+            'start station name', 'start station latitude',
+            'start station longitude', 'end station id', 'end station name',
+            'end station latitude', 'end station longitude', 'bikeid',
+            'usertype', 'birth year', 'gender'],
+    'Chicago': ['trip_id', 'starttime', 'stoptime', 'bikeid', 'tripduration',
+                'from_station_id', 'from_station_name', 'to_station_id',
+                'to_station_name', 'usertype', 'gender', 'birthyear'],
+    'Washington': ['Duration (ms)', 'Start date', 'End date',
+                   'Start station number', 'Start station',
+                   'End station number', 'End station', 'Bike number',
+                   'Member Type'],
+}
+
+CITY_FILES = {
+    'NYC': 'NYC-CitiBike-2016.csv',
+    'Chicago': 'Chicago-Divvy-2016.csv',
+    'Washington': 'Washington-CapitalBikeshare-2016.csv',
+}
+
+_YEAR_SECONDS = 366 * 24 * 3600
+
+
+def _timestamp(t, seconds):
+    clock = t.strftime('%H:%M:%S' if seconds else '%H:%M')
+    return '{}/{}/{} {}'.format(t.month, t.day, t.year, clock)
+
+
+def city_rows(city, n_rows, seed=0):
+    """
+    Yield n_rows trips for a city in start time order, as lists of strings
+    matching CITY_COLUMNS[city].
+    """
+    rng = random.Random(seed)
+    start = datetime(2016, 1, 1)
+    step = _YEAR_SECONDS / max(n_rows, 1)
+    stations = ['{} St & {} Ave'.format(i, i % 12 + 1) for i in range(600)]
+
+    for i in range(n_rows):
+        started = start + timedelta(seconds=int(i * step))
+        # mostly short trips with a long tail, like the real data
+        duration = int(rng.lognormvariate(6.5, 0.8)) + 60
+        stopped = started + timedelta(seconds=duration)
+        station, end_station = rng.randrange(600), rng.randrange(600)
+        subscriber = rng.random() < 0.85
+
+        if city == 'NYC':
+            yield [str(duration), _timestamp(started, True),
+                   _timestamp(stopped, True), str(station), stations[station],
+                   '40.7', '-73.9', str(end_station), stations[end_station],
+                   '40.7', '-73.9', str(rng.randrange(20000, 30000)),
+                   'Subscriber' if subscriber else 'Customer',
+                   str(rng.randrange(1940, 2000)) if subscriber else '',
+                   str(rng.randrange(3))]
+        elif city == 'Chicago':
+            yield [str(i), _timestamp(started, False),
+                   _timestamp(stopped, False), str(rng.randrange(6000)),
+                   str(duration), str(station), stations[station],
+                   str(end_station), stations[end_station],
+                   'Subscriber' if subscriber else 'Customer',
+                   'Male' if subscriber else '',
+                   str(rng.randrange(1940, 2000)) if subscriber else '']
+        else:
+            yield [str(duration * 1000 + rng.randrange(1000)),
+                   _timestamp(started, False), _timestamp(stopped, False),
+                   str(31000 + station), stations[station],
+                   str(31000 + end_station), stations[end_station],
+                   'W{:05d}'.format(rng.randrange(5000)),
+                   'Registered' if subscriber else 'Casual']
+
+
+def write_city_file(path, city, n_rows, seed=0):
+    """Write a synthetic trip file for a city and return its path."""
+    with open(path, 'w', newline='') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(CITY_COLUMNS[city])
+        writer.writerows(city_rows(city, n_rows, seed))
+    return path
+
+
+def generate(out_dir, n_rows, cities=None, seed=0):
+    """
+    Write one synthetic file per city into out_dir and return a city_info
+    dictionary like the notebook's, pointing at them.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    city_info = {}
+    for city in cities or CITY_FILES:
+        in_file = os.path.join(out_dir, CITY_FILES[city])
+        write_city_file(in_file, city, n_rows, seed)
+        city_info[city] = {
+            'in_file': in_file,
+            'out_file': os.path.join(out_dir, '{}-2016-Summary.csv'.format(city)),
+        }
+    return city_info
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--out', default='bench-data')
+    parser.add_argument('--city', action='append', choices=sorted(CITY_FILES))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for city, filenames in generate(args.out, args.rows, args.city,
+                                    args.seed).items():
+        print(city, filenames['in_file'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Cold import time of the bikeshare package.
+
+Each import is timed in a fresh interpreter, and the script reports whether
+NumPy or matplotlib got pulled in along the way (they should not be, until
+something that needs them is used).
+
+    python benchmarks/import_time.py
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+IMPORTS = [
+    'import bikeshare',
+    'from bikeshare import duration_in_mins, time_of_trip, type_of_user',
+    'from bikeshare import condense_data, number_of_trips, func, func2',
+    'from bikeshare import condense_data_batch',
+    'import numpy',
+    'import matplotlib.pyplot',
+]
+
+_PROBE = '''
+import sys, time
+start = time.perf_counter()
+{}
+seconds = time.perf_counter() - start
+print(seconds, 'numpy' in sys.modules, 'matplotlib' in sys.modules)
+'''
+
+
+def time_import(statement, repeat=5):
+    """Best cold import time of statement over repeat fresh interpreters."""
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', _PROBE.format(statement)], cwd=ROOT,
+            universal_newlines=True)
+        seconds, numpy, matplotlib = output.split()
+        if best is None or float(seconds) < best[0]:
+            best = (float(seconds), numpy == 'True', matplotlib == 'True')
+    return best
+
+
+def main():
+    for statement in IMPORTS:
+        seconds, numpy, matplotlib = time_import(statement)
+        print('{:<70} {:>8.1f} ms  numpy={} matplotlib={}'.format(
+            statement, seconds * 1000, numpy, matplotlib))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Timing of csv.DictReader against bikeshare.reader.read_columns, reading one
+column of a summary file (as number_of_trips does), all five typed columns
+(as the Aggregator does) and three columns of a raw trip file (as
+condense_data does).
+
+    python benchmarks/reader.py [n_trips]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bikeshare.reader import read_columns
+from bikeshare.vectorized import condense_data_batch
+from generate import write_city_file
+
+SUMMARY_COLUMNS = ['duration', 'month', 'hour', 'day_of_week', 'user_type']
+SUMMARY_TYPES = [float, int, int, None, None]
+RAW_COLUMNS = ['tripduration', 'starttime', 'usertype']
+
+
+def dict_reader(path, columns, types):
+    with open(path, 'r') as f_in:
+        for row in csv.DictReader(f_in):
+            tuple(convert(row[column]) if convert else row[column]
+                  for column, convert in zip(columns, types))
+
+
+def column_reader(path, columns, types):
+    with open(path, 'r') as f_in:
+        for row in read_columns(f_in, columns, types):
+            pass
+
+
+def main():
+    n_trips = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = write_city_file(os.path.join(tmp, 'NYC.csv'), 'NYC', n_trips)
+        summary = os.path.join(tmp, 'NYC-Summary.csv')
+        condense_data_batch(raw, summary, 'NYC')
+
+        cases = [
+            ('summary, user_type only', summary, ['user_type'], [None]),
+            ('summary, 5 typed columns', summary, SUMMARY_COLUMNS,
+             SUMMARY_TYPES),
+            ('raw NYC, 3 of 15 columns', raw, RAW_COLUMNS, [None] * 3),
+        ]
+        for name, path, columns, types in cases:
+            slow = min(timeit.repeat(
+                lambda: dict_reader(path, columns, types), number=1, repeat=3))
+            fast = min(timeit.repeat(
+                lambda: column_reader(path, columns, types), number=1,
+                repeat=3))
+            print('{:<26} DictReader {:>9.0f} rows/s   read_columns {:>9.0f}'
+                  ' rows/s   speedup {:.1f}x'.format(
+                      name, n_trips / slow, n_trips / fast, slow / fast))
+
+
+if __name__ == '__main__':
+    main()
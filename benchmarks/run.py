@@ -0,0 +1,265 @@
+"""
+Benchmark suite for the condensing and analysis pipeline.
+
+Synthetic NYC-, Chicago- and Washington-shaped files (see generate.py) are
+written for each requested size and condensed once, then every stage is run
+for every city in a fresh Python process. The peak RSS reported is the
+stage's own: how far the process grew above its RSS once the stage's input
+was prepared. Results are reported as rows/s and peak RSS; they can be saved
+as a baseline
+and later runs compared against it, failing when a stage got slower than the
+tolerance allows.
+
+    python benchmarks/run.py --rows 10000 --rows 1000000
+    python benchmarks/run.py --rows 100000 --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --rows 100000 --baseline benchmarks/baseline.json
+
+Everything runs offline with the standard library and NumPy.
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import bikeshare
+from generate import CITY_FILES, generate
+
+
+# raw rows held in memory by the row helper stages, which run over them as
+# many times as it takes to cover the file
+ROW_SAMPLE = 10000
+
+
+def _raw_rows(in_file, n_rows=ROW_SAMPLE):
+    with open(in_file, 'r') as f_in:
+        return list(islice(csv.DictReader(f_in), n_rows))
+
+
+def _summary(filenames, city):
+    """The plain summary CSV written by prepare, without any caches."""
+    from bikeshare.columnar import columnar_path
+    from bikeshare.cube import cube_path
+
+    out_file = filenames['out_file']
+    for path in (columnar_path(out_file), cube_path(out_file)):
+        if os.path.exists(path):
+            os.remove(path)
+    return out_file
+
+
+# each stage prepares its input and returns (number of rows, function to time)
+
+def _row_function(name):
+    def stage(filenames, city):
+        rows = _raw_rows(filenames['in_file'])
+        passes = -(-bikeshare.count_rows(filenames['in_file']) // len(rows))
+        function = getattr(bikeshare, name)
+
+        def run():
+            for _ in range(passes):
+                for row in rows:
+                    function(row, city)
+        return passes * len(rows), run
+    return stage
+
+
+def _condense(filenames, city):
+    out_file = filenames['out_file'] + '.bench'
+    n_rows = bikeshare.count_rows(filenames['in_file'])
+    return n_rows, lambda: bikeshare.condense_data(filenames['in_file'],
+                                                   out_file, city)
+
+
+def _condense_batch(filenames, city):
+    from bikeshare.vectorized import condense_data_batch
+
+    out_file = filenames['out_file'] + '.bench'
+    n_rows = bikeshare.count_rows(filenames['in_file'])
+    return n_rows, lambda: condense_data_batch(filenames['in_file'], out_file,
+                                               city)
+
+
+def _condense_parallel(filenames, city):
+    from bikeshare.parallel import condense_parallel
+
+    info = {city: {'in_file': filenames['in_file'],
+                   'out_file': filenames['out_file'] + '.bench'}}
+    n_rows = bikeshare.count_rows(filenames['in_file'])
+    return n_rows, lambda: condense_parallel(info)
+
+
+def _summary_function(name, *args):
+    def stage(filenames, city):
+        out_file = _summary(filenames, city)
+        n_rows = bikeshare.count_rows(out_file)
+        function = getattr(bikeshare, name)
+        return n_rows, lambda: function(out_file, *args)
+    return stage
+
+
+STAGES = {
+    'duration_in_mins': _row_function('duration_in_mins'),
+    'time_of_trip': _row_function('time_of_trip'),
+    'type_of_user': _row_function('type_of_user'),
+    'condense_data': _condense,
+    'condense_data_batch': _condense_batch,
+    'condense_parallel': _condense_parallel,
+    'number_of_trips': _summary_function('number_of_trips'),
+    'func': _summary_function('func'),
+    'func2': _summary_function('func2'),
+    'analysis': _summary_function('analysis', 'all'),
+}
+
+
+def _status_mb(field):
+    """A memory field of /proc/self/status (Linux), in MB."""
+    with open('/proc/self/status', 'r') as f_in:
+        for line in f_in:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    raise OSError('no {} in /proc/self/status'.format(field))
+
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def _reset_peak_rss():
+    """
+    Return the RSS in MB to measure a stage's peak from, resetting the
+    process' peak RSS to its current RSS where Linux allows it. Elsewhere
+    the peak so far is the best baseline there is.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f_out:
+            f_out.write('5')
+        return _status_mb('VmRSS')
+    except OSError:
+        return _max_rss_mb()
+
+
+def _peak_rss():
+    try:
+        return _status_mb('VmHWM')
+    except OSError:
+        return _max_rss_mb()
+
+
+def run_stage(stage, city, workdir):
+    """Run one stage in this process and return its measurements."""
+    with open(os.path.join(workdir, 'city_info.json'), 'r') as f_in:
+        filenames = json.load(f_in)[city]
+    n_rows, function = STAGES[stage](filenames, city)
+    base_rss = _reset_peak_rss()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    return {'rows': n_rows, 'seconds': seconds,
+            'rows_per_sec': n_rows / seconds if seconds else float('inf'),
+            # growth above the RSS after setup, so only the stage is counted
+            'peak_rss_mb': max(0.0, _peak_rss() - base_rss),
+            'base_rss_mb': base_rss}
+
+
+def prepare(workdir, n_rows, cities):
+    """
+    Generate the synthetic input files for one size and their summaries,
+    once, so no stage's setup condenses anything.
+    """
+    from bikeshare.vectorized import condense_data_batch
+
+    path = os.path.join(workdir, 'city_info.json')
+    city_info = None
+    if os.path.exists(path):
+        with open(path, 'r') as f_in:
+            city_info = json.load(f_in)
+        if not set(cities) <= set(city_info):
+            city_info = None
+    if city_info is None:
+        city_info = generate(workdir, n_rows, cities)
+        with open(path, 'w') as f_out:
+            json.dump(city_info, f_out, indent=2)
+    for city in cities:
+        filenames = city_info[city]
+        if not os.path.exists(filenames['out_file']):
+            condense_data_batch(filenames['in_file'], filenames['out_file'],
+                                city)
+    return city_info
+
+
+def run_all(sizes, cities, stages, workdir):
+    """Run every stage for every city and size, each in a fresh process."""
+    results = {}
+    for n_rows in sizes:
+        size_dir = os.path.join(workdir, str(n_rows))
+        prepare(size_dir, n_rows, cities)
+        for city in cities:
+            for stage in stages:
+                output = subprocess.run(
+                    [sys.executable, __file__, '--child', stage, city, size_dir],
+                    check=True, stdout=subprocess.PIPE, universal_newlines=True)
+                result = json.loads(output.stdout.splitlines()[-1])
+                key = '{}/{}/{}'.format(stage, city, n_rows)
+                results[key] = result
+                print('{:<48} {:>12.0f} rows/s {:>+9.1f} MB'.format(
+                    key, result['rows_per_sec'], result['peak_rss_mb']))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the keys whose rows/s dropped by more than tolerance."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]['rows_per_sec']
+        if result['rows_per_sec'] < before * (1 - tolerance):
+            regressions.append(key)
+            print('REGRESSION {}: {:.0f} -> {:.0f} rows/s'.format(
+                key, before, result['rows_per_sec']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, action='append',
+                        help='trips per city file (repeatable, default 10000)')
+    parser.add_argument('--city', action='append', choices=sorted(CITY_FILES))
+    parser.add_argument('--stage', action='append', choices=list(STAGES))
+    parser.add_argument('--workdir', default=os.path.join('/tmp', 'bikeshare-bench'))
+    parser.add_argument('--baseline', help='compare against this baseline file')
+    parser.add_argument('--save-baseline', help='save the results here')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed drop in rows/s before failing (default 0.2)')
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        stage, city, workdir = args.child
+        print(json.dumps(run_stage(stage, city, workdir)))
+        return
+
+    results = run_all(args.rows or [10000], args.city or sorted(CITY_FILES),
+                      args.stage or list(STAGES), args.workdir)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f_out:
+            json.dump(results, f_out, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, 'r') as f_in:
+            if compare(results, json.load(f_in), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark of trip start time parsing: datetime.strptime + strftime, as
+time_of_trip originally did, against bikeshare.timeparse.parse_start_time.
+
+    python benchmarks/time_of_trip.py [n_trips]
+"""
+
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bikeshare.schema import get_schema
+from bikeshare.timeparse import parse_start_time
+
+
+def make_start_times(n_trips, with_seconds, seed=0):
+    """Generate n_trips start time strings spread over 2016."""
+    rng = random.Random(seed)
+    start = datetime(2016, 1, 1)
+    times = []
+    for _ in range(n_trips):
+        t = start + timedelta(seconds=rng.randrange(366 * 24 * 3600))
+        clock = t.strftime('%H:%M:%S' if with_seconds else '%H:%M')
+        times.append('{}/{}/{} {}'.format(t.month, t.day, t.year, clock))
+    return times
+
+
+def strptime_parse(value, fmt):
+    date = datetime.strptime(value, fmt)
+    return (date.month, date.hour, date.strftime('%A'))
+
+
+def main():
+    n_trips = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for city in ('NYC', 'Chicago', 'Washington'):
+        fmt = get_schema(city).start_format
+        times = make_start_times(n_trips, fmt.endswith('%S'))
+        assert ([strptime_parse(t, fmt) for t in times[:1000]] ==
+                [parse_start_time(t) for t in times[:1000]])
+
+        slow = min(timeit.repeat(lambda: [strptime_parse(t, fmt) for t in times],
+                                 number=1, repeat=3))
+        fast = min(timeit.repeat(lambda: [parse_start_time(t) for t in times],
+                                 number=1, repeat=3))
+        print('{:<11} strptime {:>9.0f} rows/s   parse_start_time {:>9.0f} rows/s'
+              '   speedup {:.1f}x'.format(city, n_trips / slow, n_trips / fast,
+                                          slow / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Helpers for analysing condensed bike-share trip data.
+
+The notebook (Bike_Share_Analysis.ipynb) walks through the analysis step by
+step; the modules in this package hold the reusable pieces it relies on.
+Importing the package is cheap: submodules, and NumPy and matplotlib with
+them, are only imported when one of their names is first used.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'print_first_point': 'wrangling',
+    'duration_in_mins': 'wrangling',
+    'time_of_trip': 'wrangling',
+    'type_of_user': 'wrangling',
+    'condense_data': 'wrangling',
+    'Quarantine': 'quarantine',
+    'number_of_trips': 'stats',
+    'func': 'stats',
+    'func2': 'stats',
+    'trip_times': 'stats',
+    'trip_times2': 'stats',
+    'analysis': 'stats',
+    'load_table': 'stats',
+    'QueryCache': 'cache',
+    'Aggregator': 'aggregate',
+    'group_by': 'external',
+    'trip_series': 'external',
+    'PipelineStats': 'instrument',
+    'TripStore': 'store',
+    'open_store': 'store',
+    'write_store': 'store',
+    'profile': 'instrument',
+    'UserTypeCounts': 'aggregate',
+    'DurationSummary': 'aggregate',
+    'UserTypeMeans': 'aggregate',
+    'DurationList': 'aggregate',
+    'MonthList': 'aggregate',
+    'summarize': 'aggregate',
+    'write_columnar': 'columnar',
+    'append_columnar': 'columnar',
+    'load_columnar': 'columnar',
+    'has_columnar': 'columnar',
+    'TripTable': 'columnar',
+    'open_text': 'compression',
+    'write_blocks': 'compression',
+    'count_rows': 'mapped',
+    'first_record': 'mapped',
+    'CitySchema': 'schema',
+    'get_schema': 'schema',
+    'register_schemas': 'schema',
+    'load_schemas': 'schema',
+    'parse_start_time': 'timeparse',
+    'condense_data_batch': 'vectorized',
+    'condense_parallel': 'parallel',
+    'condense_incremental': 'manifest',
+    'ingest': 'ingest',
+    'count_trips': 'estimate',
+    'estimate_trips': 'estimate',
+    'Histogram': 'histogram',
+    'histogram': 'histogram',
+    'plot_histograms': 'histogram',
+    'Cube': 'cube',
+    'build_cube': 'cube',
+    'append_cube': 'cube',
+    'load_cube': 'cube',
+    'QuantileSketch': 'sketch',
+    'DurationQuantiles': 'sketch',
+    'duration_quantiles': 'sketch',
+    'Moments': 'moments',
+    'DurationMoments': 'moments',
+    'duration_moments': 'moments',
+    'city_moments': 'moments',
+    'report_files': 'report',
+    'write_report': 'report',
+    'main': 'cli',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
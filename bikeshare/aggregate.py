@@ -0,0 +1,308 @@
+"""
+Single-pass aggregation over condensed trip summary files.
+
+Each statistic the notebook asks about (trip counts by user type, average
+duration, share of long rides, per-user-type means, duration and month lists)
+is an object with an ``update`` and a ``result`` method. An ``Aggregator``
+holds any number of them and feeds every row of a summary file to all of them,
+so a file is read and parsed only once no matter how many statistics are
+wanted.
+
+When a summary has an up-to-date columnar cache (see ``bikeshare.columnar``)
+the statistics are computed from its arrays with ``update_columns`` instead of
+parsing the CSV text. Statistics that are roll-ups over the condensed columns
+(``from_cube = True``) can even be read off the summary's pre-aggregated cube
+(see ``bikeshare.cube``) with ``update_cube``, without looking at any trip.
+"""
+
+import io
+import math
+
+from .columnar import has_columnar, has_cube, load_columnar
+from .compression import compression_of, open_text
+from .mapped import read_summary
+from .reader import read_columns
+from .wrangling import OUT_COLNAMES
+
+SUMMARY_TYPES = [float, int, int, None, None]
+
+
+def read_summary_rows(file, offset=0):
+    """
+    Yield (duration, month, hour, day_of_week, user_type) for every trip of
+    a summary file. Plain files are scanned as bytes through a memory map
+    (see bikeshare.mapped); compressed ones are read as text. Given the
+    byte offset of a line of a plain file, only the trips from there on
+    are read (e.g. the trips just appended to it).
+    """
+    if offset:
+        with open(file, 'rb') as f_in:
+            f_in.seek(offset)
+            yield from read_columns(io.TextIOWrapper(f_in, newline=''),
+                                    OUT_COLNAMES, SUMMARY_TYPES,
+                                    header=OUT_COLNAMES)
+        return
+    if not compression_of(file):
+        yield from read_summary(file, OUT_COLNAMES, SUMMARY_TYPES)
+        return
+    with open_text(file) as f_in:
+        yield from read_columns(f_in, OUT_COLNAMES, SUMMARY_TYPES)
+
+
+def _mean(total, count):
+    return total/count if count else math.nan
+
+
+class UserTypeCounts:
+    """
+    Number of trips and the proportions made by subscribers and customers.
+    Same result as number_of_trips().
+    """
+
+    from_cube = True
+
+    def __init__(self):
+        self.n_trips = 0
+        self.n_subscribers = 0
+        self.n_customers = 0
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        self.n_trips += 1
+        if user_type == 'Subscriber':
+            self.n_subscribers += 1
+        else:
+            self.n_customers += 1
+
+    def update_columns(self, cols):
+        n_subscribers = int(cols.is_user_type('Subscriber').sum())
+        self.n_trips += len(cols)
+        self.n_subscribers += n_subscribers
+        self.n_customers += len(cols) - n_subscribers
+
+    def update_cube(self, cube):
+        for user_type, (count, _, _) in cube.user_type_totals().items():
+            self.n_trips += count
+            if user_type == 'Subscriber':
+                self.n_subscribers += count
+            else:
+                self.n_customers += count
+
+    def result(self):
+        return (self.n_trips, self.n_subscribers/self.n_trips,
+                self.n_customers/self.n_trips)
+
+
+class DurationSummary:
+    """
+    Average trip length (truncated to whole minutes) and the percentage of
+    rides longer than 30 minutes. Same result as func().
+    """
+
+    from_cube = True
+
+    def __init__(self):
+        self.n_trips = 0
+        self.sum_of_trip_duration = 0
+        self.rides_more_than_thirty = 0
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        self.n_trips += 1
+        self.sum_of_trip_duration += duration
+        if duration > 30:
+            self.rides_more_than_thirty += 1
+
+    def update_columns(self, cols):
+        self.n_trips += len(cols)
+        self.sum_of_trip_duration += float(cols.duration.sum(dtype='f8'))
+        self.rides_more_than_thirty += int((cols.duration > 30).sum())
+
+    def update_cube(self, cube):
+        for count, duration_sum, over_30 in cube.user_type_totals().values():
+            self.n_trips += count
+            self.sum_of_trip_duration += duration_sum
+            self.rides_more_than_thirty += over_30
+
+    def result(self):
+        return (int(self.sum_of_trip_duration/self.n_trips),
+                float(self.rides_more_than_thirty*100/self.n_trips))
+
+
+class UserTypeMeans:
+    """
+    Average trip duration of subscribers and of customers. Same result as
+    func2(); the average of a user type without trips is nan.
+    """
+
+    from_cube = True
+
+    def __init__(self):
+        self.n_subs = 0
+        self.n_cust = 0
+        self.sum_of_trip_duration_subs = 0
+        self.sum_of_trip_duration_cust = 0
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        if user_type == 'Subscriber':
+            self.n_subs += 1
+            self.sum_of_trip_duration_subs += duration
+        else:
+            self.n_cust += 1
+            self.sum_of_trip_duration_cust += duration
+
+    def update_columns(self, cols):
+        subs = cols.is_user_type('Subscriber')
+        self.n_subs += int(subs.sum())
+        self.n_cust += int((~subs).sum())
+        self.sum_of_trip_duration_subs += float(
+            cols.duration[subs].sum(dtype='f8'))
+        self.sum_of_trip_duration_cust += float(
+            cols.duration[~subs].sum(dtype='f8'))
+
+    def update_cube(self, cube):
+        for user_type, (count, duration_sum, _) in cube.user_type_totals().items():
+            if user_type == 'Subscriber':
+                self.n_subs += count
+                self.sum_of_trip_duration_subs += duration_sum
+            else:
+                self.n_cust += count
+                self.sum_of_trip_duration_cust += duration_sum
+
+    def result(self):
+        return (_mean(self.sum_of_trip_duration_subs, self.n_subs),
+                _mean(self.sum_of_trip_duration_cust, self.n_cust))
+
+
+class DurationList:
+    """
+    List of trip durations, optionally only for one user type ('Subscriber'
+    or 'Customer'). Same result as trip_times() / trip_times2().
+    """
+
+    def __init__(self, user_type=None):
+        self.user_type = user_type
+        self.list_of_times = []
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        if self.user_type is None or user_type == self.user_type:
+            self.list_of_times.append(duration)
+
+    def update_columns(self, cols):
+        duration = cols.duration
+        if self.user_type is not None:
+            duration = duration[cols.is_user_type(self.user_type)]
+        self.list_of_times.extend(duration.tolist())
+
+    def result(self):
+        return self.list_of_times
+
+
+class MonthList:
+    """
+    List of the month of every trip, for 'all' users, 'customer' or
+    'subscriber'. Same result as analysis().
+    """
+
+    _user_types = {'customer': 'Customer', 'subscriber': 'Subscriber'}
+
+    def __init__(self, user_type='all'):
+        if user_type != 'all' and user_type not in self._user_types:
+            raise ValueError('unknown user type: {}'.format(user_type))
+        self.user_type = self._user_types.get(user_type)
+        self.months = []
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        if self.user_type is None or user_type == self.user_type:
+            self.months.append(month)
+
+    def update_columns(self, cols):
+        month = cols.month
+        if self.user_type is not None:
+            month = month[cols.is_user_type(self.user_type)]
+        self.months.extend(month.tolist())
+
+    def result(self):
+        return self.months
+
+
+class Aggregator:
+    """
+    Collects statistics and computes all of them in one pass over a
+    condensed summary file.
+
+        agg = Aggregator()
+        agg.add('counts', UserTypeCounts())
+        agg.add('durations', DurationSummary())
+        results = agg.run('./data/Chicago-2016-Summary.csv')
+    """
+
+    def __init__(self):
+        self.stats = {}
+
+    def add(self, name, stat):
+        """Register a statistic under a name and return it."""
+        self.stats[name] = stat
+        return stat
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        """Feed one already-typed trip to every registered statistic."""
+        for stat in self.stats.values():
+            stat.update(duration, month, hour, day_of_week, user_type)
+
+    def update_columns(self, cols):
+        """Feed a Columns block of trips to every registered statistic."""
+        for stat in self.stats.values():
+            stat.update_columns(cols)
+
+    def update_cube(self, cube):
+        """Feed a Cube to every registered statistic."""
+        for stat in self.stats.values():
+            stat.update_cube(cube)
+
+    def run(self, file, use_columnar=True, use_cube=True):
+        """
+        Read the summary file once, updating every statistic with each row,
+        and return a dictionary of results keyed by statistic name. When
+        every statistic can be answered from the file's cube and the cube is
+        up to date, the cube is used instead; otherwise the columnar cache is
+        used when it is up to date. use_cube and use_columnar turn these off.
+        """
+        if (use_cube and self.stats and has_cube(file)
+                and all(getattr(stat, 'from_cube', False)
+                        for stat in self.stats.values())):
+            # NumPy is only imported once there is a cube to read
+            from .cube import load_cube
+            self.update_cube(load_cube(file))
+            return self.results()
+
+        if use_columnar and has_columnar(file):
+            self.update_columns(load_columnar(file))
+            return self.results()
+
+        updates = [stat.update for stat in self.stats.values()]
+        # parse each field once, however many statistics use it
+        for duration, month, hour, day_of_week, user_type in read_summary_rows(
+                file):
+            for update in updates:
+                update(duration, month, hour, day_of_week, user_type)
+        return self.results()
+
+    def results(self):
+        return {name: stat.result() for name, stat in self.stats.items()}
+
+
+def summarize(file):
+    """
+    Compute every statistic used in the notebook for one summary file in a
+    single pass. Keys match the function each value replaces.
+    """
+    agg = Aggregator()
+    agg.add('number_of_trips', UserTypeCounts())
+    agg.add('func', DurationSummary())
+    agg.add('func2', UserTypeMeans())
+    agg.add('trip_times', DurationList())
+    agg.add('trip_times_subscriber', DurationList('Subscriber'))
+    agg.add('trip_times_customer', DurationList('Customer'))
+    agg.add('analysis', MonthList('all'))
+    agg.add('analysis_subscriber', MonthList('subscriber'))
+    agg.add('analysis_customer', MonthList('customer'))
+    return agg.run(file)
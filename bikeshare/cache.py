@@ -0,0 +1,197 @@
+"""
+Memoised query results for summary files that have not changed.
+
+A dashboard asks number_of_trips(file), func(file) or analysis(file, 'all')
+again and again of the same summaries. A QueryCache remembers each result
+under the function, its arguments and the file's identity (path, size and
+modification time, or the sha256 of its content with by_hash=True), in a
+least recently used order within a memory budget, and optionally in a
+directory of pickles that outlives the process:
+
+    cache = QueryCache(max_bytes=32 << 20, directory='./.query-cache')
+    number_of_trips = cache.wrap(bikeshare.number_of_trips)
+    number_of_trips('./data/NYC-2016-Summary.csv')    # computed
+    number_of_trips('./data/NYC-2016-Summary.csv')    # from the cache
+    cache.hits, cache.misses
+
+A rewritten summary has a new size or modification time and so new keys,
+and the condense functions also call invalidate() for the files they write,
+which drops their entries from every cache. Cached results are returned as
+they are, so callers should not modify them.
+"""
+
+import os
+import sys
+import weakref
+from collections import OrderedDict
+
+_caches = weakref.WeakSet()
+
+
+def invalidate(path):
+    """Drop the entries of a file from every QueryCache."""
+    for cache in list(_caches):
+        cache.invalidate(path)
+
+
+def _file_prefix(path):
+    import hashlib
+
+    return hashlib.sha256(path.encode()).hexdigest()[:16] + '-'
+
+
+def _size_of(value):
+    """Approximate memory taken by a result, including what it contains."""
+    # arrays, TripTables and Cubes count their data, which getsizeof leaves
+    # out of everything but a NumPy array owning its buffer
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return sys.getsizeof(object()) + nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_size_of(k) + _size_of(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(map(_size_of, value))
+    return size
+
+
+class QueryCache:
+    """
+    Least recently used cache of query results on summary files, holding
+    at most max_bytes of results in memory and, if directory is given, all
+    of them on disk as well.
+    """
+
+    def __init__(self, max_bytes=64 << 20, directory=None, by_hash=False):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.by_hash = by_hash
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Hit and miss counters and memory use."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._entries), 'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes}
+
+    def _identity(self, path):
+        if self.by_hash:
+            from .manifest import file_fingerprint
+            return file_fingerprint(path)['sha256']
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def key(self, function, path, args, kwargs=None):
+        """
+        The key of function(path, *args, **kwargs) for the file as it is
+        now.
+        """
+        path = os.path.abspath(path)
+        name = '{}.{}'.format(function.__module__, function.__qualname__)
+        if kwargs:
+            # keyword arguments in any order give the same key
+            args = args + (tuple(sorted(kwargs.items())),)
+        return (path, name, self._identity(path), args)
+
+    def _disk_path(self, key):
+        import hashlib
+
+        # entries of one file share a prefix, so they can be found again
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, '{}{}.pickle'.format(
+            _file_prefix(key[0]), digest))
+
+    def get(self, key):
+        """Return (True, result) for a cached key, else (False, None)."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key][0]
+        if self.directory:
+            import pickle
+            try:
+                with open(self._disk_path(key), 'rb') as f_in:
+                    result = pickle.load(f_in)
+            except (OSError, pickle.PickleError, EOFError):
+                pass
+            else:
+                self.hits += 1
+                self._remember(key, result)
+                return True, result
+        self.misses += 1
+        return False, None
+
+    def put(self, key, result):
+        """Store the result of a key, in memory and on disk."""
+        self._remember(key, result)
+        if self.directory:
+            import pickle
+            path = self._disk_path(key)
+            with open(path + '.tmp', 'wb') as f_out:
+                pickle.dump(result, f_out, pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+
+    def _remember(self, key, result):
+        size = _size_of(result)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        self._entries[key] = (result, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+
+    def call(self, function, path, *args, **kwargs):
+        """
+        Return function(path, *args, **kwargs), from the cache when
+        possible.
+        """
+        key = self.key(function, path, args, kwargs)
+        found, result = self.get(key)
+        if not found:
+            result = function(path, *args, **kwargs)
+            self.put(key, result)
+        return result
+
+    def wrap(self, function):
+        """
+        A version of function(path, *args, **kwargs) that goes through the
+        cache.
+        """
+        def cached(path, *args, **kwargs):
+            return self.call(function, path, *args, **kwargs)
+        cached.__name__ = function.__name__
+        cached.__doc__ = function.__doc__
+        cached.__wrapped__ = function
+        return cached
+
+    def invalidate(self, path):
+        """Drop every entry of one file, in memory and on disk."""
+        path = os.path.abspath(path)
+        for key in [key for key in self._entries if key[0] == path]:
+            self.nbytes -= self._entries.pop(key)[1]
+        if self.directory:
+            prefix = _file_prefix(path)
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.directory, name))
+
+    def clear(self):
+        """Drop every entry, in memory and on disk."""
+        self._entries.clear()
+        self.nbytes = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pickle'):
+                    os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,149 @@
+"""
+Command line entry point: condense the trip data of every city and report
+the notebook's statistics, optionally saving its figures.
+
+    python -m bikeshare --data-dir ./data --plots ./figures
+"""
+
+import argparse
+import os
+from pprint import pprint
+
+# the notebook's cities; other systems are picked up from their schemas
+CITY_FILES = {
+    'Washington': 'Washington-CapitalBikeshare-2016.csv',
+    'Chicago': 'Chicago-Divvy-2016.csv',
+    'NYC': 'NYC-CitiBike-2016.csv',
+}
+
+
+def find_input(path):
+    """path, or its compressed copy (.gz, .bz2, .xz) if only that exists."""
+    from .compression import COMPRESSIONS
+    if not os.path.exists(path):
+        for ext in COMPRESSIONS:
+            if os.path.exists(path + ext):
+                return path + ext
+    return path
+
+
+def default_city_info(data_dir='./data'):
+    """
+    The notebook's city_info dictionary, for files in data_dir, plus every
+    other registered system (see bikeshare.schema) whose file is there.
+    """
+    from .schema import SCHEMAS
+
+    city_info = {city: {'in_file': find_input(os.path.join(data_dir, in_file)),
+                        'out_file': os.path.join(
+                            data_dir, '{}-2016-Summary.csv'.format(city))}
+                 for city, in_file in CITY_FILES.items()}
+    for city, schema in SCHEMAS.items():
+        if city in city_info or schema.file is None:
+            continue
+        in_file = find_input(os.path.join(data_dir, schema.file))
+        if os.path.exists(in_file):
+            city_info[city] = {'in_file': in_file,
+                               'out_file': os.path.join(
+                                   data_dir, '{}-Summary.csv'.format(city))}
+    return city_info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Condense bike-share trip data and report statistics.')
+    parser.add_argument('--data-dir', default='./data',
+                        help='directory holding the raw city files')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--full', action='store_true',
+                        help='condense every file again, even if unchanged')
+    parser.add_argument('--plots', metavar='DIR',
+                        help='save the figures of every city, drawn in parallel, '
+                             'and a report comparing them into DIR')
+    parser.add_argument('--schemas', metavar='FILE',
+                        help='JSON file of further systems (see '
+                             'bikeshare.schema)')
+    parser.add_argument('--quarantine', action='store_true',
+                        help='write rows that cannot be condensed next to '
+                             'each summary (*.rejected.csv) instead of '
+                             'stopping')
+    parser.add_argument('--max-error-rate', type=float, metavar='RATE',
+                        help='with --quarantine, fail a city when more than '
+                             'this share of its rows is bad')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='append the time of each stage to FILE as a '
+                             'JSON line')
+    parser.add_argument('--profile', nargs='?', const='cumulative',
+                        metavar='SORT',
+                        help='run under cProfile and print the hottest calls, '
+                             'sorted by SORT (default: cumulative)')
+    args = parser.parse_args(argv)
+
+    if args.schemas:
+        from .schema import load_schemas
+        load_schemas(args.schemas)
+
+    if args.profile:
+        from .instrument import profile
+        return profile(run, args, sort=args.profile)
+    return run(args)
+
+
+def run(args):
+    """Condense, report and plot every city as main's args ask."""
+    from .instrument import PipelineStats
+    from .parallel import condense_parallel
+    from .sketch import duration_quantiles
+    from .stats import func, func2, number_of_trips
+    from .wrangling import print_first_point
+
+    stats = PipelineStats('cli')
+    city_info = default_city_info(args.data_dir)
+    for filenames in city_info.values():
+        print_first_point(filenames['in_file'])
+        stats.bytes_read += os.path.getsize(filenames['in_file'])
+    stats.lap('first_point')
+
+    quarantines = None
+    if args.quarantine:
+        from .quarantine import Quarantine, quarantine_path
+        quarantines = {city: Quarantine(quarantine_path(filenames['out_file']),
+                                        max_error_rate=args.max_error_rate)
+                       for city, filenames in city_info.items()}
+    actions = condense_parallel(city_info, workers=args.workers,
+                                columnar=True, cube=True,
+                                incremental=not args.full,
+                                quarantine=quarantines)
+    stats.lap('condense')
+
+    for city, filenames in city_info.items():
+        out_file = filenames['out_file']
+        n_trips, subscribers, customers = number_of_trips(out_file)
+        mean_duration, over_30 = func(out_file)
+        subscriber_mean, customer_mean = func2(out_file)
+        stats.rows += n_trips
+        stats.bytes_written += os.path.getsize(out_file)
+        print('\n{} ({})'.format(city, actions[city]))
+        if quarantines and actions[city] != 'skip':
+            print(quarantines[city])
+        pprint({'n_trips': n_trips,
+                'proportion_of_subscribers': subscribers,
+                'proportion_of_customers': customers,
+                'average_trip_length': mean_duration,
+                'percent_longer_than_30': over_30,
+                'average_subscriber_trip': subscriber_mean,
+                'average_customer_trip': customer_mean,
+                'duration_quantiles': duration_quantiles(out_file)})
+        stats.lap('statistics')
+
+    if args.plots:
+        from .report import report_files, write_report
+        print('saved', write_report(report_files(city_info), args.plots,
+                                    workers=args.workers))
+        stats.lap('plots')
+
+    if args.stats:
+        stats.finish()
+        stats.write_json(args.stats)
+    return 0
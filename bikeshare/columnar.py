@@ -0,0 +1,336 @@
+"""
+Columnar binary cache for condensed trip summaries.
+
+A summary CSV such as ./data/Chicago-2016-Summary.csv can have a companion
+./data/Chicago-2016-Summary.npz holding the same trips as typed NumPy arrays:
+
+    duration     float32  trip duration in minutes
+    month        uint8    1-12
+    hour         uint8    0-23
+    day_of_week  uint8    0 = Monday ... 6 = Sunday
+    user_type    uint8    index into the ``user_types`` array
+
+Reading these arrays is much cheaper than parsing the CSV text again, and they
+take eight bytes per trip. Durations are stored in single precision, so means
+computed from the cache can differ from the CSV ones in the last few digits.
+"""
+
+import os
+from array import array
+
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+                'Saturday', 'Sunday']
+USER_TYPES = ['Subscriber', 'Customer']
+
+
+def columnar_path(csv_file):
+    """Return the path of the columnar cache that belongs to a summary CSV."""
+    return os.path.splitext(csv_file)[0] + '.npz'
+
+
+def is_fresh(cache_file, csv_file):
+    """
+    True if cache_file exists and is at least as recent as csv_file (a CSV
+    rewritten after its cache makes the cache stale).
+    """
+    if not os.path.exists(cache_file):
+        return False
+    if not os.path.exists(csv_file):
+        return True
+    return os.path.getmtime(cache_file) >= os.path.getmtime(csv_file)
+
+
+def has_columnar(csv_file):
+    """True if the summary has an up-to-date columnar cache."""
+    return is_fresh(columnar_path(csv_file), csv_file)
+
+
+# the cube's path lives here rather than in bikeshare.cube, so that looking
+# for a cube does not import NumPy
+
+def cube_path(csv_file):
+    """Return the path of the cube that belongs to a summary CSV."""
+    return os.path.splitext(csv_file)[0] + '.cube.npz'
+
+
+def has_cube(csv_file):
+    """True if the summary has a cube at least as recent as the CSV."""
+    return is_fresh(cube_path(csv_file), csv_file)
+
+
+class TripTable:
+    """
+    Condensed trips held in memory as compact typed arrays, one per column,
+    with day_of_week and user_type stored as small integer codes: twelve
+    bytes per trip instead of the hundreds a csv.DictReader row takes.
+
+    It is also an Aggregator statistic whose result is the table itself:
+
+        table = load_table('./data/NYC-2016-Summary.csv')
+        customers = table.filter(user_type='Customer')
+        customers.values('duration'), customers.count_by('month')
+
+    filter, group and count_by use NumPy.
+    """
+
+    duration_type = 'd'
+    # NumPy dtype of each array typecode used here
+    _dtypes = {'d': 'f8', 'f': 'f4', 'B': 'u1'}
+
+    def __init__(self, user_types=USER_TYPES):
+        self.duration = array(self.duration_type)
+        self.month = array('B')
+        self.hour = array('B')
+        self.day_of_week = array('B')
+        self.user_type = array('B')
+        self.user_types = list(user_types)
+        self._day_codes = {day: i for i, day in enumerate(DAYS_OF_WEEK)}
+        self._user_codes = {user: i for i, user in enumerate(self.user_types)}
+
+    def __len__(self):
+        return len(self.duration)
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the trips' columns."""
+        return sum(column.itemsize * len(column)
+                   for column in self._columns().values())
+
+    def _columns(self):
+        return {'duration': self.duration, 'month': self.month,
+                'hour': self.hour, 'day_of_week': self.day_of_week,
+                'user_type': self.user_type}
+
+    def _user_code(self, user_type):
+        code = self._user_codes.get(user_type)
+        if code is None:
+            # unexpected user types get their own code
+            code = len(self.user_types)
+            self.user_types.append(user_type)
+            self._user_codes[user_type] = code
+        return code
+
+    def append(self, duration, month, hour, day_of_week, user_type):
+        """
+        Add one trip. A value that does not fit its column raises and adds
+        nothing, so the columns keep the same length.
+        """
+        day_code = self._day_codes[day_of_week]
+        user_code = self._user_code(user_type)
+        n = len(self.duration)
+        try:
+            self.duration.append(duration)
+            self.month.append(month)
+            self.hour.append(hour)
+            self.day_of_week.append(day_code)
+            self.user_type.append(user_code)
+        except (OverflowError, TypeError):
+            self.truncate(n)
+            raise
+
+    def truncate(self, n):
+        """Keep only the first n trips."""
+        for column in self._columns().values():
+            del column[n:]
+
+    # Aggregator statistic protocol
+
+    update = append
+
+    def update_columns(self, cols):
+        import numpy as np
+
+        user_codes = np.array([self._user_code(user_type)
+                               for user_type in cols.user_types] or [0],
+                              dtype='u1')
+        for name, values in (('duration', cols.duration),
+                             ('month', cols.month), ('hour', cols.hour),
+                             ('day_of_week', cols.day_of_week),
+                             ('user_type', user_codes[cols.user_type])):
+            column = getattr(self, name)
+            column.frombytes(np.asarray(
+                values, dtype=self._dtypes[column.typecode]).tobytes())
+
+    def result(self):
+        return self
+
+    # queries
+
+    def _array(self, name):
+        import numpy as np
+
+        column = getattr(self, name)
+        # a copy, so the array.array can still grow afterwards
+        return np.array(column, dtype=self._dtypes[column.typecode])
+
+    def _code_of(self, name, value):
+        if name == 'day_of_week':
+            return self._day_codes.get(value, -1)
+        if name == 'user_type':
+            return self._user_codes.get(value, -1)
+        return value
+
+    def values(self, name):
+        """The values of one column, as a list of numbers or names."""
+        column = getattr(self, name)
+        if name == 'day_of_week':
+            return [DAYS_OF_WEEK[code] for code in column]
+        if name == 'user_type':
+            return [self.user_types[code] for code in column]
+        return column.tolist()
+
+    def mask(self, **conditions):
+        """
+        Boolean NumPy mask of the trips whose columns equal the given
+        values, e.g. mask(user_type='Customer', month=7). None matches any
+        value.
+        """
+        import numpy as np
+
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in conditions.items():
+            if value is not None:
+                mask &= self._array(name) == self._code_of(name, value)
+        return mask
+
+    def take(self, mask):
+        """A new table of the trips selected by a mask or index array."""
+        table = TripTable(self.user_types)
+        for name in self._columns():
+            column = getattr(table, name)
+            column.frombytes(self._array(name)[mask].astype(
+                self._dtypes[column.typecode]).tobytes())
+        return table
+
+    def filter(self, **conditions):
+        """A new table of the trips matching conditions (see mask)."""
+        return self.take(self.mask(**conditions))
+
+    def group(self, by):
+        """Dictionary of a table per distinct value of column by."""
+        import numpy as np
+
+        codes = self._array(by)
+        return {self._value_of(by, code): self.take(codes == code)
+                for code in np.unique(codes).tolist()}
+
+    def count_by(self, by):
+        """Dictionary of the number of trips per distinct value of by."""
+        import numpy as np
+
+        codes, counts = np.unique(self._array(by), return_counts=True)
+        return {self._value_of(by, code): count
+                for code, count in zip(codes.tolist(), counts.tolist())}
+
+    def _value_of(self, name, code):
+        if name == 'day_of_week':
+            return DAYS_OF_WEEK[code]
+        if name == 'user_type':
+            return self.user_types[code]
+        return code
+
+
+class ColumnarWriter(TripTable):
+    """
+    Accumulates condensed trips in compact typed arrays and saves them as a
+    columnar cache when closed.
+    """
+
+    duration_type = 'f'
+
+    def __init__(self, path, user_types=USER_TYPES):
+        TripTable.__init__(self, user_types)
+        self.path = path
+
+    def close(self):
+        import numpy as np
+
+        np.savez(self.path,
+                 duration=np.frombuffer(self.duration, dtype=np.float32),
+                 month=np.frombuffer(self.month, dtype=np.uint8),
+                 hour=np.frombuffer(self.hour, dtype=np.uint8),
+                 day_of_week=np.frombuffer(self.day_of_week, dtype=np.uint8),
+                 user_type=np.frombuffer(self.user_type, dtype=np.uint8),
+                 user_types=np.array(self.user_types))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class Columns:
+    """
+    Typed columns of one summary file, as loaded from its columnar cache.
+    """
+
+    def __init__(self, duration, month, hour, day_of_week, user_type,
+                 user_types):
+        self.duration = duration
+        self.month = month
+        self.hour = hour
+        self.day_of_week = day_of_week
+        self.user_type = user_type
+        self.user_types = list(user_types)
+
+    def __len__(self):
+        return len(self.duration)
+
+    def is_user_type(self, name):
+        """Boolean mask of the trips made by the given user type."""
+        if name not in self.user_types:
+            return self.user_type != self.user_type
+        return self.user_type == self.user_types.index(name)
+
+
+def write_columnar(csv_file, path=None):
+    """
+    Build the columnar cache for an existing summary CSV and return its path.
+    """
+    from .aggregate import read_summary_rows
+    from .cache import invalidate
+
+    if path is None:
+        path = columnar_path(csv_file)
+    with ColumnarWriter(path) as writer:
+        for row in read_summary_rows(csv_file):
+            writer.append(*row)
+    # later queries read the cache, whose durations are rounded
+    invalidate(csv_file)
+    return path
+
+
+def append_columnar(csv_file, offset, path=None):
+    """
+    Add the trips written to a summary CSV from byte offset onwards to its
+    columnar cache, which must hold the trips before offset, and return the
+    cache's path. Only the new rows are parsed.
+    """
+    import numpy as np
+
+    from .aggregate import read_summary_rows
+    from .cache import invalidate
+
+    if path is None:
+        path = columnar_path(csv_file)
+    with np.load(path) as data:
+        writer = ColumnarWriter(path, data['user_types'].tolist())
+        for name, column in writer._columns().items():
+            column.frombytes(data[name].tobytes())
+    with writer:
+        for row in read_summary_rows(csv_file, offset):
+            writer.append(*row)
+    invalidate(csv_file)
+    return path
+
+
+def load_columnar(csv_file):
+    """Load the columnar cache of a summary CSV as a Columns object."""
+    import numpy as np
+
+    with np.load(columnar_path(csv_file)) as data:
+        return Columns(data['duration'], data['month'], data['hour'],
+                       data['day_of_week'], data['user_type'],
+                       data['user_types'].tolist())
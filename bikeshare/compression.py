@@ -0,0 +1,183 @@
+"""
+Transparent reading and writing of compressed trip files.
+
+Files ending in .gz, .bz2 or .xz are read and written through the matching
+standard library module; anything else is a plain text file. Reading a
+compressed file decompresses it in a background thread (zlib, bz2 and lzma
+release the GIL while they work), so decompression overlaps with parsing the
+CSV instead of adding to it.
+
+All three formats allow a file to be a series of independently compressed
+blocks. write_blocks compresses a text file that way, cutting the blocks at
+line breaks, and saves the offsets of the blocks in a small index next to it
+(<file>.blocks.json). Condensing an indexed file decompresses its blocks in
+parallel worker processes (see bikeshare.parallel); files without an index
+are read as one stream.
+"""
+
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import queue
+import threading
+
+_MODULES = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+
+# file extensions of the supported compression formats
+COMPRESSIONS = tuple(_MODULES)
+
+_READ_SIZE = 1 << 20
+_BLOCK_SIZE = 16 << 20
+
+
+def compression_of(path):
+    """The compression extension of path ('.gz', '.bz2', '.xz') or None."""
+    ext = os.path.splitext(path)[1].lower()
+    return ext if ext in _MODULES else None
+
+
+class _ReadAhead(io.RawIOBase):
+    """
+    Raw binary stream of a compressed file, decompressed by a background
+    thread that stays up to a few chunks ahead of the reader.
+    """
+
+    def __init__(self, path, depth=4):
+        self._file = _MODULES[compression_of(path)].open(path, 'rb')
+        self._chunks = queue.Queue(maxsize=depth)
+        self._pending = memoryview(b'')
+        self._done = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                chunk = self._file.read(_READ_SIZE)
+                self._chunks.put(chunk)
+                if not chunk:
+                    return
+        except Exception as error:
+            self._chunks.put(error)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._done:
+            chunk = self._chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                self._done = True
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            # stop the thread, unblocking it if it waits on a full queue
+            self._stop.set()
+            while self._thread.is_alive():
+                try:
+                    self._chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._file.close()
+        super().close()
+
+
+def open_text(path, mode='r', readahead=True):
+    """
+    Open a plain or compressed text file for reading ('r'), writing ('w')
+    or appending ('a'), choosing the compression from the extension.
+    """
+    ext = compression_of(path)
+    if ext is None:
+        return open(path, mode)
+    if mode == 'r' and readahead:
+        return io.TextIOWrapper(io.BufferedReader(_ReadAhead(path)))
+    return _MODULES[ext].open(path, mode + 't')
+
+
+def open_binary(path):
+    """Open a plain or compressed file for reading its (decompressed) bytes."""
+    ext = compression_of(path)
+    if ext is None:
+        return open(path, 'rb')
+    return _MODULES[ext].open(path, 'rb')
+
+
+def compress(data, ext):
+    """Compress bytes into one block of the given format."""
+    return _MODULES[ext].compress(data)
+
+
+def decompress(data, ext):
+    """Decompress bytes holding one or more whole blocks."""
+    return _MODULES[ext].decompress(data)
+
+
+def index_path(path):
+    """Path of the block index of a compressed file."""
+    return path + '.blocks.json'
+
+
+def write_blocks(in_file, out_file, block_size=_BLOCK_SIZE):
+    """
+    Compress the plain text file in_file into out_file (format from its
+    extension) as independent blocks of about block_size uncompressed bytes
+    that each end at a line break, and write the block index.
+    """
+    ext = compression_of(out_file)
+    offsets = [0]
+    with open(in_file, 'rb') as f_in, open(out_file, 'wb') as f_out:
+        while True:
+            block = f_in.read(block_size)
+            if not block:
+                break
+            # finish the last line, so that no line spans two blocks
+            block += f_in.readline()
+            f_out.write(compress(block, ext))
+            offsets.append(f_out.tell())
+    save_index(out_file, offsets)
+    return out_file
+
+
+def save_index(path, offsets):
+    """Record the byte offsets where the blocks of a compressed file start."""
+    stat = os.stat(path)
+    with open(index_path(path), 'w') as f_out:
+        json.dump({'size': stat.st_size, 'mtime': stat.st_mtime,
+                   'offsets': offsets}, f_out)
+
+
+def load_index(path):
+    """
+    The list of (begin, end) byte ranges of the blocks of a compressed file,
+    or None if it has no index or the index does not match the file.
+    """
+    try:
+        with open(index_path(path), 'r') as f_in:
+            index = json.load(f_in)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(path)
+    if index['size'] != stat.st_size or index['mtime'] != stat.st_mtime:
+        return None
+    offsets = index['offsets']
+    return list(zip(offsets, offsets[1:]))
+
+
+def read_blocks(path, begin, end):
+    """Decompressed bytes of the blocks stored between begin and end."""
+    with open(path, 'rb') as f_in:
+        f_in.seek(begin)
+        data = f_in.read(end - begin)
+    return decompress(data, compression_of(path))
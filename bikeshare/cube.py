@@ -0,0 +1,202 @@
+"""
+Pre-aggregated trip cube.
+
+Every question the notebook asks is a roll-up over the condensed columns. A
+Cube holds, for every (month, hour, day_of_week, user_type) cell, the number
+of trips, the sum and sum of squares of their durations and the number of
+trips longer than 30 minutes. That is 12 x 24 x 7 cells per user type, a few
+tens of kilobytes, whatever the number of trips, and trip counts, means,
+variances and long-ride shares for any combination of cells can be read off
+it without touching the trips again.
+
+The cube of ./data/Chicago-2016-Summary.csv is saved as
+./data/Chicago-2016-Summary.cube.npz.
+"""
+
+import numpy as np
+
+from .cache import invalidate
+from .columnar import DAYS_OF_WEEK, USER_TYPES, cube_path, has_cube
+
+_FIELDS = ('count', 'duration_sum', 'duration_sumsq', 'over_30')
+
+
+class Cube:
+    """
+    Trip counts and duration sums by month x hour x day_of_week x
+    user_type. A Cube is also an Aggregator statistic, so it can be filled in
+    the same pass as other statistics.
+    """
+
+    def __init__(self, user_types=USER_TYPES):
+        self.user_types = list(user_types)
+        shape = (12, 24, 7, len(self.user_types))
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.duration_sum = np.zeros(shape)
+        self.duration_sumsq = np.zeros(shape)
+        self.over_30 = np.zeros(shape, dtype=np.int64)
+        self._day_codes = {day: i for i, day in enumerate(DAYS_OF_WEEK)}
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the cube's arrays."""
+        return sum(getattr(self, field).nbytes for field in _FIELDS)
+
+    def _user_code(self, user_type):
+        try:
+            return self.user_types.index(user_type)
+        except ValueError:
+            # add a slice for an unexpected user type
+            self.user_types.append(user_type)
+            for field in _FIELDS:
+                array = getattr(self, field)
+                pad = np.zeros(array.shape[:3] + (1,), dtype=array.dtype)
+                setattr(self, field, np.concatenate([array, pad], axis=3))
+            return len(self.user_types) - 1
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        cell = (month - 1, hour, self._day_codes[day_of_week],
+                self._user_code(user_type))
+        self.count[cell] += 1
+        self.duration_sum[cell] += duration
+        self.duration_sumsq[cell] += duration * duration
+        if duration > 30:
+            self.over_30[cell] += 1
+
+    def update_columns(self, cols):
+        codes = np.array([self._user_code(user_type)
+                          for user_type in cols.user_types])
+        n_users = len(self.user_types)
+        cell = (((cols.month.astype(np.int64) - 1) * 24 + cols.hour) * 7
+                + cols.day_of_week) * n_users + codes[cols.user_type]
+        size = self.count.size
+        duration = cols.duration.astype(np.float64)
+        shape = self.count.shape
+        self.count += np.bincount(cell, minlength=size).reshape(shape)
+        self.duration_sum += np.bincount(cell, duration, size).reshape(shape)
+        self.duration_sumsq += np.bincount(cell, duration * duration,
+                                           size).reshape(shape)
+        self.over_30 += np.bincount(cell, duration > 30,
+                                    size).astype(np.int64).reshape(shape)
+
+    def result(self):
+        return self
+
+    def save(self, path):
+        np.savez(path, user_types=np.array(self.user_types),
+                 **{field: getattr(self, field) for field in _FIELDS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            cube = cls(data['user_types'].tolist())
+            for field in _FIELDS:
+                setattr(cube, field, data[field])
+        return cube
+
+    def select(self, month=None, hour=None, day_of_week=None,
+               user_type=None):
+        """
+        Totals over the cells matching the given month (1-12), hour,
+        day_of_week ('Monday'...) and user_type; None means all values.
+        Returns a dictionary of count, mean, variance and share_over_30
+        (a percentage), with None for the statistics of an empty selection.
+        """
+        index = (slice(None) if month is None else month - 1,
+                 slice(None) if hour is None else hour,
+                 slice(None) if day_of_week is None
+                 else DAYS_OF_WEEK.index(day_of_week),
+                 slice(None) if user_type is None else self._user_index(user_type))
+        count = int(self.count[index].sum())
+        if count == 0:
+            return {'count': 0, 'mean': None, 'variance': None,
+                    'share_over_30': None}
+        total = float(self.duration_sum[index].sum())
+        mean = total / count
+        variance = max(float(self.duration_sumsq[index].sum()) / count
+                       - mean * mean, 0.0)
+        return {'count': count, 'mean': mean, 'variance': variance,
+                'share_over_30': int(self.over_30[index].sum()) * 100 / count}
+
+    def _user_index(self, user_type):
+        if user_type not in self.user_types:
+            # no trips by this user type: select an empty slice
+            return slice(0, 0)
+        return self.user_types.index(user_type)
+
+    def user_type_totals(self):
+        """
+        Dictionary of user type -> (count, duration sum, trips over 30
+        minutes) over all cells.
+        """
+        count = self.count.reshape(-1, len(self.user_types)).sum(axis=0)
+        duration_sum = self.duration_sum.reshape(
+            -1, len(self.user_types)).sum(axis=0)
+        over_30 = self.over_30.reshape(-1, len(self.user_types)).sum(axis=0)
+        return {user_type: (int(count[i]), float(duration_sum[i]),
+                            int(over_30[i]))
+                for i, user_type in enumerate(self.user_types)}
+
+    def _answer(self, stat):
+        stat.update_cube(self)
+        return stat.result()
+
+    def trip_counts(self):
+        """(n_trips, subscriber share, customer share), like number_of_trips."""
+        from .aggregate import UserTypeCounts
+        return self._answer(UserTypeCounts())
+
+    def duration_summary(self):
+        """(truncated mean duration, % over 30 minutes), like func."""
+        from .aggregate import DurationSummary
+        return self._answer(DurationSummary())
+
+    def user_type_means(self):
+        """(subscriber mean, customer mean) duration, like func2."""
+        from .aggregate import UserTypeMeans
+        return self._answer(UserTypeMeans())
+
+    def month_counts(self, user_type=None):
+        """Number of trips in each month, January first."""
+        counts = self.count
+        if user_type is not None:
+            counts = counts[..., self._user_index(user_type)]
+        return counts.reshape(12, -1).sum(axis=1).tolist()
+
+
+def build_cube(csv_file, path=None):
+    """
+    Build and save the cube of a summary file and return it. The trips are
+    read from the CSV itself, never from the columnar cache, whose float32
+    durations would round the sums.
+    """
+    from .aggregate import Aggregator
+
+    agg = Aggregator()
+    cube = agg.add('cube', Cube())
+    agg.run(csv_file, use_columnar=False)
+    cube.save(path or cube_path(csv_file))
+    invalidate(csv_file)
+    return cube
+
+
+def append_cube(csv_file, offset, path=None):
+    """
+    Add the trips written to a summary CSV from byte offset onwards to its
+    saved cube, which must hold the trips before offset, and return the
+    cube. Only the new rows are read, from the CSV as in build_cube.
+    """
+    from .aggregate import read_summary_rows
+
+    path = path or cube_path(csv_file)
+    cube = Cube.load(path)
+    for row in read_summary_rows(csv_file, offset):
+        cube.update(*row)
+    cube.save(path)
+    invalidate(csv_file)
+    return cube
+
+
+def load_cube(csv_file):
+    """Load the cube saved for a summary CSV."""
+    return Cube.load(cube_path(csv_file))
@@ -0,0 +1,263 @@
+"""
+Quick totals and proportions of huge summary files.
+
+number_of_trips and func parse every row. For an operational check of a
+file of tens of millions of trips there are two faster ways:
+
+    count_trips       exact number_of_trips result, from byte searches: rows
+                      are counted as line breaks (blank lines skipped, as
+                      number_of_trips does) and subscribers as
+                      occurrences of ',Subscriber' at the end of a line,
+                      in large blocks of bytes, without splitting any row
+    estimate_trips    subscriber share, mean duration, share of trips over
+                      30 minutes and number of trips, each with a confidence
+                      interval, from a sample of about fraction of the file
+
+estimate_trips cuts the file into equal strata of bytes and reads one
+random window of lines in each, so every part of the year is represented
+however the file is ordered. Each window is a cluster of trips; the
+intervals are those of ratio estimators over the clusters, which accounts
+for trips in a window being alike.
+
+    python -m bikeshare.estimate data/NYC-2016-Summary.csv --sample 0.01
+
+count_trips reads plain or compressed files; estimate_trips needs a plain
+file, which it maps into memory to jump between windows.
+"""
+
+import math
+import random
+from collections import namedtuple
+
+from .compression import compression_of, open_binary
+from .mapped import (WINDOW, count_lines, line_blocks, line_end, map_file,
+                     split_rows)
+
+Estimate = namedtuple('Estimate', ['value', 'low', 'high'])
+
+# bytes of a sampling window, unless the sample is too small for it
+_CLUSTER_BYTES = 64 << 10
+# windows taken at the least, so the intervals have enough clusters
+_MIN_CLUSTERS = 30
+
+
+def _blocks(path, window=WINDOW):
+    """Yield line-aligned byte blocks of a plain or compressed file."""
+    ext = compression_of(path)
+    if ext is None:
+        with map_file(path) as mapped:
+            yield from line_blocks(mapped, window=window)
+        return
+    carry = b''
+    with open_binary(path) as f_in:
+        while True:
+            chunk = f_in.read(window)
+            if not chunk:
+                break
+            chunk = carry + chunk
+            cut = chunk.rfind(b'\n') + 1
+            carry = chunk[cut:]
+            if cut:
+                yield chunk[:cut]
+    if carry:
+        yield carry
+
+
+def _layout(header_line, column):
+    """Separator of a file's lines and the index of column in its header."""
+    separator = b'\r\n' if header_line.endswith(b'\r\n') else b'\n'
+    header = header_line.decode().rstrip('\r\n').split(',')
+    return separator, header, header.index(column)
+
+
+def count_trips(path, user_type='Subscriber', column='user_type',
+                window=WINDOW):
+    """
+    Return the number of trips of a summary file and the proportions made
+    by subscribers and by everyone else, like number_of_trips, by counting
+    line breaks and searching for the user type in column as bytes.
+    """
+    blocks = _blocks(path, window)
+    first = next(blocks, b'')
+    header_end = first.find(b'\n') + 1
+    if not header_end:
+        raise ZeroDivisionError('{} holds no trips'.format(path))
+    separator, header, index = _layout(first[:header_end], column)
+    value = user_type.encode()
+    # the user type is found between the separators of its column
+    before = b',' if index > 0 else separator
+    after = separator if index == len(header) - 1 else b','
+    pattern = before + value + after
+
+    n_lines = n_matches = 0
+    last = b''
+    for block in _chain(first, blocks):
+        n_lines += count_lines(block)
+        n_matches += block.count(pattern)
+        if index == 0 and block.startswith(value + after):
+            n_matches += 1
+        last = block
+    if (not last.endswith(b'\n') and last.endswith(before + value)
+            and after == separator):
+        # a final line without a line break
+        n_matches += 1
+    n_trips = n_lines - 1
+    return (n_trips, n_matches/n_trips, (n_trips - n_matches)/n_trips)
+
+
+def _chain(first, blocks):
+    yield first
+    yield from blocks
+
+
+def _z(confidence):
+    from statistics import NormalDist
+
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _ratio(totals, sizes, fraction, z):
+    """
+    Ratio estimate sum(totals)/sum(sizes) over clusters and its confidence
+    interval, with the finite population correction for fraction.
+    """
+    m = len(sizes)
+    size = sum(sizes)
+    ratio = sum(totals) / size
+    if m < 2 or fraction >= 1:
+        return Estimate(ratio, ratio, ratio)
+    residuals = sum((total - ratio * n) ** 2
+                    for total, n in zip(totals, sizes))
+    mean_size = size / m
+    error = math.sqrt((1 - fraction) * residuals / (m * (m - 1))) / mean_size
+    return Estimate(ratio, ratio - z * error, ratio + z * error)
+
+
+def estimate_trips(path, fraction=0.01, confidence=0.95, clusters=None,
+                   seed=None, user_type='Subscriber'):
+    """
+    Estimate the statistics of a plain summary file from about fraction of
+    its bytes, read as one random window of lines in each of clusters equal
+    strata (default: one per 64 kB sampled, at least 30). Returns a
+    dictionary of Estimate(value, low, high) tuples at the given confidence
+    level:
+
+        n_trips                     number of trips in the file
+        proportion_of_subscribers   share of trips by user_type
+        proportion_of_customers     share of the other trips
+        average_trip_length         mean duration in minutes, not truncated
+        percent_longer_than_30      percentage of trips over 30 minutes
+
+    and the rows_sampled and bytes_sampled it is based on.
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError('fraction must be in (0, 1]: {}'.format(fraction))
+    if compression_of(path) is not None:
+        raise ValueError('sampling needs an uncompressed file: {}'.format(
+            path))
+    value = user_type.encode()
+    rng = random.Random(seed)
+
+    with map_file(path) as mapped:
+        header_end = line_end(mapped)
+        separator, header, user_index = _layout(bytes(mapped[:header_end]),
+                                                'user_type')
+        duration_index = header.index('duration')
+        data_bytes = len(mapped) - header_end
+        if data_bytes <= 0:
+            raise ZeroDivisionError('{} holds no trips'.format(path))
+        sample_bytes = max(1, int(data_bytes * fraction))
+        if clusters is None:
+            clusters = max(_MIN_CLUSTERS, sample_bytes // _CLUSTER_BYTES)
+        clusters = max(1, min(clusters, sample_bytes))
+        stratum = data_bytes / clusters
+        # rounded up, so that with fraction 1 the windows cover every
+        # stratum and so the whole file
+        width = max(1, math.ceil(sample_bytes / clusters))
+
+        rows, sizes, subscribers, durations, over_30 = [], [], [], [], []
+        for i in range(clusters):
+            low = header_end + int(i * stratum)
+            high = header_end + int((i + 1) * stratum)
+            window = min(width, high - low)
+            start = low + rng.randint(0, high - low - window)
+            # the window holds the lines that start inside it
+            begin = start if start == header_end else line_end(
+                mapped, start - 1)
+            end = min(start + window, len(mapped))
+            end = end if end == begin else line_end(mapped, end - 1)
+            if end <= begin:
+                rows.append(0)
+                sizes.append(0)
+                subscribers.append(0)
+                durations.append(0.0)
+                over_30.append(0)
+                continue
+            # blank lines are not trips
+            lines = split_rows(mapped[begin:end], separator)
+            n_subscribers = n_over_30 = 0
+            total = 0.0
+            for line in lines:
+                fields = line.split(b',')
+                duration = float(fields[duration_index])
+                total += duration
+                if duration > 30:
+                    n_over_30 += 1
+                if fields[user_index] == value:
+                    n_subscribers += 1
+            rows.append(len(lines))
+            sizes.append(end - begin)
+            subscribers.append(n_subscribers)
+            durations.append(total)
+            over_30.append(n_over_30)
+
+    if not sum(rows):
+        raise ZeroDivisionError('no trips in the sample of {}'.format(path))
+    z = _z(confidence)
+    sampled = sum(sizes) / data_bytes
+    subscriber_share = _ratio(subscribers, rows, sampled, z)
+    per_byte = _ratio(rows, sizes, sampled, z)
+    over_30_share = _ratio(over_30, rows, sampled, z)
+    return {
+        'n_trips': Estimate(*(bound * data_bytes for bound in per_byte)),
+        'proportion_of_subscribers': subscriber_share,
+        'proportion_of_customers': Estimate(1 - subscriber_share.value,
+                                            1 - subscriber_share.high,
+                                            1 - subscriber_share.low),
+        'average_trip_length': _ratio(durations, rows, sampled, z),
+        'percent_longer_than_30': Estimate(*(100 * bound
+                                             for bound in over_30_share)),
+        'rows_sampled': sum(rows),
+        'bytes_sampled': sum(sizes),
+    }
+
+
+def main(argv=None):
+    import argparse
+    from pprint import pprint
+
+    parser = argparse.ArgumentParser(
+        description='Count or estimate the trips of summary files quickly.')
+    parser.add_argument('paths', nargs='+', help='summary files')
+    parser.add_argument('--sample', type=float, metavar='FRACTION',
+                        help='estimate from this fraction of each file '
+                             'instead of counting exactly')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='confidence level of the intervals')
+    parser.add_argument('--seed', type=int, help='seed of the sample')
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        print(path)
+        if args.sample:
+            pprint(estimate_trips(path, args.sample, args.confidence,
+                                  seed=args.seed))
+        else:
+            n_trips, subscribers, customers = count_trips(path)
+            pprint({'n_trips': n_trips,
+                    'proportion_of_subscribers': subscribers,
+                    'proportion_of_customers': customers})
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
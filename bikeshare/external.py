@@ -0,0 +1,259 @@
+"""
+Out-of-core group-by for daily, hourly and per-station time series.
+
+Condensed summaries keep only the month, hour and weekday of a trip, so
+series by day (or by station) are built from the raw trip files, which may
+span several years. group_by aggregates (key, duration) records in a
+dictionary until it holds max_groups keys, then spills them to a temporary
+file sorted by key (a run). The runs are merged k at a time with heapq.merge
+and equal keys are combined, so memory stays bounded by the budget however
+many trips and keys there are:
+
+    trip_series(['NYC-2015.csv', 'NYC-2016.csv'], 'NYC', 'NYC-daily.csv',
+                by=('day', 'user_type'), memory_mb=64)
+
+writes, for each key, the number of trips and their total, mean, minimum,
+maximum and standard deviation of duration in minutes. Each group is a
+Moments accumulator (see bikeshare.moments), whose deviation stays accurate
+where the sum of squares of a group's durations would cancel out, and
+whose runs merge exactly, plus the running total of its durations. Keys can
+combine 'day' (ISO date), 'hour', 'user_type' and 'station' (if the system's
+schema knows its station column); numeric station ids sort by their value.
+"""
+
+import csv
+import heapq
+import itertools
+import math
+import os
+import pickle
+import tempfile
+
+from .compression import open_text
+from .moments import Moments
+from .reader import read_columns
+from .schema import get_schema
+
+SERIES_COLNAMES = ['count', 'total_duration', 'mean_duration',
+                   'min_duration', 'max_duration', 'std_duration']
+
+# rough memory of one group held in the dictionary: its key tuple and
+# GroupMoments
+_GROUP_BYTES = 400
+# records per pickled block of a run file
+_BLOCK = 4096
+
+
+class GroupMoments(Moments):
+    """
+    Moments that also keep the exact sum of their values, rather than
+    recovering it as n * mean: the sum is held as non-overlapping partial
+    sums (Shewchuk's algorithm, as in math.fsum), so it is the correctly
+    rounded total whatever the order values and runs are added in.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.partials = []
+
+    def add(self, value):
+        super().add(value)
+        _add_exact(self.partials, value)
+
+    def merge(self, other):
+        for value in other.partials:
+            _add_exact(self.partials, value)
+        return super().merge(other)
+
+    @property
+    def total(self):
+        return math.fsum(self.partials)
+
+
+def _add_exact(partials, value):
+    """Add value to a list of non-overlapping partial sums, in place."""
+    i = 0
+    for partial in partials:
+        if abs(value) < abs(partial):
+            value, partial = partial, value
+        high = value + partial
+        low = partial - (high - value)
+        if low:
+            partials[i] = low
+            i += 1
+        value = high
+    partials[i:] = [value]
+
+
+class Spill:
+    """
+    Sorted runs of (key, GroupMoments) items in a temporary directory.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = tempfile.mkdtemp(prefix='bikeshare-runs-',
+                                          dir=directory)
+        self.runs = []
+        self._n = 0
+
+    def write(self, items):
+        """Write key-sorted items as a new run and return its path."""
+        path = os.path.join(self.directory, 'run{}.pickle'.format(self._n))
+        self._n += 1
+        items = iter(items)
+        with open(path, 'wb') as f_out:
+            while True:
+                block = list(itertools.islice(items, _BLOCK))
+                if not block:
+                    break
+                pickle.dump(block, f_out, pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        return path
+
+    @staticmethod
+    def read(path):
+        """Yield the items of a run, one block in memory at a time."""
+        with open(path, 'rb') as f_in:
+            while True:
+                try:
+                    block = pickle.load(f_in)
+                except EOFError:
+                    return
+                yield from block
+
+    def merge(self, fan_in):
+        """
+        Yield the items of all runs in key order, equal keys combined,
+        merging at most fan_in runs at once (in several passes if needed).
+        """
+        while len(self.runs) > fan_in:
+            runs, self.runs = self.runs[:fan_in], self.runs[fan_in:]
+            self.write(_combine(heapq.merge(*map(self.read, runs),
+                                            key=_key)))
+            for path in runs:
+                os.remove(path)
+        return _combine(heapq.merge(*map(self.read, self.runs), key=_key))
+
+    def close(self):
+        for path in self.runs:
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _sort_value(value):
+    # numeric strings (station ids) by their value, ahead of other strings
+    if isinstance(value, str) and value.isdigit():
+        return (0, int(value), value)
+    return (1, 0, value)
+
+
+def _key(item):
+    return tuple(map(_sort_value, item[0]))
+
+
+def _combine(items):
+    """Merge the GroupMoments of consecutive items with equal keys."""
+    for _, group in itertools.groupby(items, key=_key):
+        key, moments = next(group)
+        for _, other in group:
+            moments.merge(other)
+        yield key, moments
+
+
+def group_by(records, memory_mb=64, tmp_dir=None):
+    """
+    Yield (key, GroupMoments of its values) in key order for an iterable of
+    (key, value) records, keeping about memory_mb in memory and spilling
+    sorted runs to tmp_dir (default: the system's temporary directory).
+    Numeric strings in keys sort by their value, so station 72 comes
+    before station 519.
+    """
+    max_groups = max(1, int(memory_mb * 1e6 / _GROUP_BYTES))
+    # each run being merged holds one block in memory
+    fan_in = max(2, int(memory_mb * 1e6 / (_BLOCK * _GROUP_BYTES)))
+    groups = {}
+    with Spill(tmp_dir) as spill:
+        for key, value in records:
+            moments = groups.get(key)
+            if moments is None:
+                if len(groups) >= max_groups:
+                    spill.write(sorted(groups.items(), key=_key))
+                    groups.clear()
+                moments = groups[key] = GroupMoments()
+            moments.add(value)
+        if not spill.runs:
+            # everything fit in memory
+            yield from sorted(groups.items(), key=_key)
+            return
+        if groups:
+            spill.write(sorted(groups.items(), key=_key))
+            groups.clear()
+        yield from spill.merge(fan_in)
+
+
+def trip_records(in_file, city, by=('day', 'user_type')):
+    """
+    Return an iterator of (key, duration in minutes) for every trip of a
+    raw file, where key holds the fields named in by. Unknown fields raise
+    ValueError straight away.
+    """
+    schema = get_schema(city)
+    columns = list(schema.columns)
+    for field in by:
+        if field not in ('day', 'hour', 'user_type', 'station'):
+            raise ValueError('unknown series key: {}'.format(field))
+    if 'station' in by:
+        if schema.station_column is None:
+            raise ValueError('no station column known for {}'.format(
+                schema.name))
+        columns.append(schema.station_column)
+    return _trip_records(in_file, schema, columns, by)
+
+
+def _trip_records(in_file, schema, columns, by):
+    parse_day = schema.parse_day
+    user_type_of = schema.user_type
+    units = schema.units_per_minute
+    with open_text(in_file) as f_in:
+        for row in read_columns(f_in, columns):
+            day, hour = parse_day(row[1])
+            fields = {'day': day, 'hour': hour,
+                      'user_type': user_type_of(row[2]),
+                      'station': row[3] if len(row) > 3 else None}
+            yield (tuple(fields[field] for field in by),
+                   int(row[0]) / units)
+
+
+def series_row(moments):
+    """The SERIES_COLNAMES values of one group's GroupMoments."""
+    # population standard deviation
+    return [moments.n, moments.total, moments.mean, moments.min,
+            moments.max, moments.std]
+
+
+def trip_series(in_files, city, out_file, by=('day', 'user_type'),
+                memory_mb=64, tmp_dir=None):
+    """
+    Write the trips of one city's raw files, grouped by the fields in by,
+    to out_file: the key fields followed by SERIES_COLNAMES, in key order.
+    Returns the number of groups written.
+    """
+    if isinstance(in_files, str):
+        in_files = [in_files]
+    records = itertools.chain.from_iterable(
+        [trip_records(in_file, city, by) for in_file in in_files])
+    n_groups = 0
+    with open_text(out_file, 'w') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(list(by) + SERIES_COLNAMES)
+        for key, moments in group_by(records, memory_mb, tmp_dir):
+            writer.writerow(list(key) + series_row(moments))
+            n_groups += 1
+    return n_groups
@@ -0,0 +1,188 @@
+"""
+Streaming fixed-bin histograms.
+
+trip_times, trip_times2 and analysis build a list of every duration or
+month just so plt.hist can count them. A Histogram counts the values into
+fixed bins as they stream past, so it only ever holds one number per bin.
+Values are binned exactly like numpy.histogram (and so plt.hist) does: bins
+are half-open except the last, which includes its right edge, and values
+outside the edges are dropped.
+
+Histograms are Aggregator statistics, so several can be filled in the same
+pass over a summary file. plot_histograms draws the counts with the same bar
+layout plt.hist would have used.
+"""
+
+from bisect import bisect_right
+
+from .aggregate import Aggregator
+
+_FIELDS = ('duration', 'month', 'hour')
+
+
+def uniform_edges(bins, lower, upper):
+    """Edges of bins equal-width bins, computed like numpy.linspace."""
+    if lower == upper:
+        lower, upper = lower - 0.5, upper + 0.5
+    step = (upper - lower) / bins
+    return [lower + i * step for i in range(bins)] + [upper]
+
+
+class Histogram:
+    """
+    Counts of one field ('duration', 'month' or 'hour') in the bins given by
+    edges, optionally only for one user type ('Subscriber' or 'Customer').
+    """
+
+    def __init__(self, edges, field='duration', user_type=None):
+        if field not in _FIELDS:
+            raise ValueError('unknown field: {}'.format(field))
+        self.edges = [float(edge) for edge in edges]
+        self.field = field
+        self.user_type = user_type
+        self.counts = [0] * (len(self.edges) - 1)
+
+    @classmethod
+    def uniform(cls, bins, lower, upper, field='duration', user_type=None):
+        """Histogram with bins equal-width bins between lower and upper."""
+        return cls(uniform_edges(bins, lower, upper), field, user_type)
+
+    def add(self, value):
+        """Count one value."""
+        edges = self.edges
+        if value < edges[0] or value > edges[-1]:
+            return
+        i = bisect_right(edges, value) - 1
+        # the last bin is closed on the right
+        if i == len(self.counts):
+            i -= 1
+        self.counts[i] += 1
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        if self.user_type is not None and user_type != self.user_type:
+            return
+        if self.field == 'duration':
+            self.add(duration)
+        elif self.field == 'month':
+            self.add(month)
+        else:
+            self.add(hour)
+
+    def update_columns(self, cols):
+        import numpy as np
+
+        values = getattr(cols, self.field)
+        if self.user_type is not None:
+            values = values[cols.is_user_type(self.user_type)]
+        counts, _ = np.histogram(values, bins=self.edges)
+        self.counts = [a + b for a, b in zip(self.counts, counts.tolist())]
+
+    @property
+    def from_cube(self):
+        # durations are not binned in the cube, months and hours are
+        return self.field != 'duration'
+
+    def update_cube(self, cube):
+        import numpy as np
+
+        counts = cube.count
+        if self.user_type is not None:
+            if self.user_type not in cube.user_types:
+                return
+            counts = counts[..., cube.user_types.index(self.user_type)]
+        if self.field == 'month':
+            values = np.arange(1, 13)
+            weights = counts.reshape(12, -1).sum(axis=1)
+        else:
+            values = np.arange(24)
+            weights = counts.swapaxes(0, 1).reshape(24, -1).sum(axis=1)
+        counts, _ = np.histogram(values, bins=self.edges, weights=weights)
+        self.counts = [a + int(b) for a, b in zip(self.counts, counts.tolist())]
+
+    def result(self):
+        return (self.counts, self.edges)
+
+
+class MinMax:
+    """Smallest and largest value of one field."""
+
+    def __init__(self, field='duration', user_type=None):
+        self.field = field
+        self.user_type = user_type
+        self.lower = None
+        self.upper = None
+
+    def _add(self, lower, upper):
+        if self.lower is None or lower < self.lower:
+            self.lower = lower
+        if self.upper is None or upper > self.upper:
+            self.upper = upper
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        if self.user_type is None or user_type == self.user_type:
+            value = {'duration': duration, 'month': month, 'hour': hour}
+            self._add(value[self.field], value[self.field])
+
+    def update_columns(self, cols):
+        values = getattr(cols, self.field)
+        if self.user_type is not None:
+            values = values[cols.is_user_type(self.user_type)]
+        if len(values):
+            self._add(float(values.min()), float(values.max()))
+
+    def result(self):
+        return (self.lower, self.upper)
+
+
+def histogram(file, field='duration', bins=10, range=None, user_type=None):
+    """
+    Counts and bin edges of one field of a summary file, like
+    plt.hist(values, bins=bins, range=range) would compute them. bins is a
+    number of equal-width bins or a sequence of edges. Without a range, an
+    extra pass finds the smallest and largest values first.
+    """
+    if not isinstance(bins, int):
+        hist = Histogram(bins, field, user_type)
+    else:
+        if range is None:
+            agg = Aggregator()
+            limits = agg.add('limits', MinMax(field, user_type))
+            agg.run(file)
+            range = limits.result()
+        hist = Histogram.uniform(bins, range[0], range[1], field, user_type)
+    agg = Aggregator()
+    agg.add('histogram', hist)
+    agg.run(file)
+    return hist.result()
+
+
+def plot_histograms(histograms, labels=None, align='mid', ax=None):
+    """
+    Draw one or more (counts, edges) histograms sharing the same edges as
+    bars, laid out the way plt.hist lays out several datasets.
+    """
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        ax = plt.gca()
+    edges = histograms[0][1]
+    lefts = edges[:-1]
+    widths = [right - left for left, right in zip(edges, edges[1:])]
+
+    # the bar geometry matplotlib's hist() uses for histtype='bar'
+    n = len(histograms)
+    dr = 0.8 if n > 1 else 1.0
+    offset = -0.5 * dr * (1 - 1 / n)
+    if align == 'mid':
+        offset += 0.5
+    elif align == 'right':
+        offset += 1.0
+
+    bars = []
+    for i, (counts, _) in enumerate(histograms):
+        label = labels[i] if labels is not None else None
+        bars.append(ax.bar([left + (offset + i * dr / n) * width
+                            for left, width in zip(lefts, widths)],
+                           counts, width=[dr / n * width for width in widths],
+                           align='center', label=label))
+    return bars
@@ -0,0 +1,256 @@
+"""
+Concurrent condensing of many raw trip files with asyncio.
+
+Systems publish their trips as many monthly files rather than one per year.
+ingest condenses a whole list of them, overlapping the three stages of
+every file:
+
+    reading    line-aligned chunks of raw text, in a thread
+    parsing    each chunk condensed in a process pool, with the row
+               converter condense_data uses (see bikeshare.schema)
+    writing    condensed chunks appended in input order, in a thread
+
+Chunks travel through a bounded queue per file, so a fast reader waits for
+slow parsing instead of piling chunks up in memory, and at most concurrency
+files are in flight at once. A progress callback is called after every
+chunk with the file's FileProgress (rows, bytes and rows/s so far).
+
+    python -m bikeshare.ingest data/*-2016-*.csv --out-dir summaries
+
+Each file's city is the part of its name before the first '-', as in
+print_first_point, unless a city is given for all of them (--city). Either
+way the city must have a schema (see bikeshare.schema; others can be loaded
+with --schemas). Output is the same as condense_data's.
+"""
+
+import asyncio
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .cache import invalidate
+from .compression import open_text
+from .reader import skip_blank
+from .schema import SCHEMAS, get_schema
+from .wrangling import OUT_COLNAMES
+
+CHUNK_BYTES = 4 << 20
+
+
+class FileProgress:
+    """
+    Rows and bytes condensed so far for one input file (bytes of text, so
+    after decompression for compressed inputs).
+    """
+
+    def __init__(self, in_file, out_file, city):
+        self.in_file = in_file
+        self.out_file = out_file
+        self.city = city
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_sec(self):
+        seconds = self.seconds
+        return self.rows / seconds if seconds else 0.0
+
+    def __str__(self):
+        return '{}: {} rows, {:.1f} MB in {:.1f} s ({:.0f} rows/s){}'.format(
+            self.in_file, self.rows, self.bytes / 1e6, self.seconds,
+            self.rows_per_sec, '' if self.done else ' ...')
+
+
+def print_progress(progress):
+    """Default progress callback: print one line per finished file."""
+    if progress.done:
+        print(progress)
+
+
+def city_of(path, city=None):
+    """
+    The city a raw file belongs to: city if given, otherwise the start of
+    its name. Raises ValueError if that city has no schema, rather than
+    reading the file like Washington as get_schema would.
+    """
+    if city is None:
+        city = os.path.basename(path).split('-')[0]
+    if city not in SCHEMAS:
+        raise ValueError('no schema for city {!r} of {} (known: {})'.format(
+            city, path, ', '.join(sorted(SCHEMAS))))
+    return city
+
+
+def summary_path(in_file, out_dir=None):
+    """Summary file name for a raw file: its name with '-Summary' added."""
+    name = os.path.basename(in_file)
+    stem, ext = os.path.splitext(name)
+    if ext != '.csv':
+        # keep a compressed input's format, e.g. x.csv.gz -> x-Summary.csv.gz
+        stem, csv_ext = os.path.splitext(stem)
+        ext = csv_ext + ext
+    return os.path.join(out_dir or os.path.dirname(in_file),
+                        '{}-Summary{}'.format(stem, ext))
+
+
+def condense_lines(lines, city, header):
+    """
+    Condense a list of raw csv lines, whose columns are named by header,
+    and return the condensed rows as csv text and their number.
+    """
+    condense_row = get_schema(city).row_converter(header)
+    f_out = io.StringIO()
+    rows = [condense_row(row) for row in skip_blank(csv.reader(lines))]
+    csv.writer(f_out).writerows(rows)
+    return f_out.getvalue(), len(rows)
+
+
+def _condense_bytes(data, encoding, city, header):
+    """condense_lines for whole lines of raw bytes in the given encoding."""
+    return condense_lines(io.StringIO(data.decode(encoding), newline=''),
+                          city, header)
+
+
+async def _ingest_file(pool, in_file, out_file, city, chunk_bytes,
+                       queue_size, progress):
+    loop = asyncio.get_running_loop()
+    schema = get_schema(city)
+    report = FileProgress(in_file, out_file, city)
+    # condensed chunks in input order; put() waits while the queue is full
+    pending = asyncio.Queue(queue_size)
+
+    async def read():
+        try:
+            with open_text(in_file) as f_in:
+                # lines are read as bytes, which are what progress counts,
+                # and decoded by the workers
+                raw, encoding = f_in.buffer, f_in.encoding
+                header = next(csv.reader([(await loop.run_in_executor(
+                    None, raw.readline)).decode(encoding)]))
+                while True:
+                    data = b''.join(await loop.run_in_executor(
+                        None, raw.readlines, chunk_bytes))
+                    if not data:
+                        break
+                    await pending.put((loop.run_in_executor(
+                        pool, _condense_bytes, data, encoding, schema,
+                        header), len(data)))
+        except Exception:
+            # let write() stop; the error is raised by awaiting this task
+            await pending.put(None)
+            raise
+        await pending.put(None)
+
+    async def write():
+        with open_text(out_file, 'w') as f_out:
+            csv.writer(f_out).writerow(OUT_COLNAMES)
+            while True:
+                item = await pending.get()
+                if item is None:
+                    break
+                future, size = item
+                text, n_rows = await future
+                await loop.run_in_executor(None, f_out.write, text)
+                report.rows += n_rows
+                report.bytes += size
+                progress(report)
+
+    reader = asyncio.ensure_future(read())
+    try:
+        await write()
+    finally:
+        reader.cancel()
+    await reader
+    invalidate(out_file)
+    report.finished = time.perf_counter()
+    progress(report)
+    return report
+
+
+async def ingest_async(jobs, workers=None, concurrency=4, queue_size=4,
+                       chunk_bytes=CHUNK_BYTES, progress=print_progress):
+    """
+    Condense every (in_file, out_file, city) of jobs, at most concurrency
+    files at a time, parsing in a pool of workers processes (default: one
+    per CPU). Each file keeps at most queue_size chunks of about
+    chunk_bytes in flight. Returns a FileProgress per job, in job order.
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async def run(in_file, out_file, city):
+        async with limit:
+            return await _ingest_file(pool, in_file, out_file, city,
+                                      chunk_bytes, queue_size, progress)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return await asyncio.gather(*(run(*job) for job in jobs))
+
+
+def ingest(paths, out_dir=None, city=None, **options):
+    """
+    Condense many raw files, each to summary_path(path, out_dir) with the
+    schema of city_of(path, city); options as for ingest_async. Prints the
+    total throughput and returns the FileProgress of every file.
+    """
+    jobs = [(path, summary_path(path, out_dir), city_of(path, city))
+            for path in paths]
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    reports = asyncio.run(ingest_async(jobs, **options))
+    seconds = time.perf_counter() - started
+    rows = sum(report.rows for report in reports)
+    print('{} files, {} rows in {:.1f} s ({:.0f} rows/s)'.format(
+        len(reports), rows, seconds, rows / seconds if seconds else 0.0))
+    return reports
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Condense many raw trip files concurrently.')
+    parser.add_argument('paths', nargs='+', help='raw trip files')
+    parser.add_argument('--out-dir',
+                        help='directory of the summaries (default: next to '
+                             'each input)')
+    parser.add_argument('--city',
+                        help='city of every file (default: the start of '
+                             'each file name)')
+    parser.add_argument('--schemas', metavar='FILE',
+                        help='JSON file of further systems (see '
+                             'bikeshare.schema)')
+    parser.add_argument('--workers', type=int,
+                        help='parsing processes (default: number of CPUs)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='files condensed at the same time')
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help='chunks in flight per file')
+    args = parser.parse_args(argv)
+    if args.schemas:
+        from .schema import load_schemas
+        load_schemas(args.schemas)
+    for path in args.paths:
+        try:
+            city_of(path, args.city)
+        except ValueError as error:
+            parser.error(str(error))
+    ingest(args.paths, args.out_dir, args.city, workers=args.workers,
+           concurrency=args.concurrency, queue_size=args.queue_size)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
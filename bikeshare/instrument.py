@@ -0,0 +1,129 @@
+"""
+Optional instrumentation of the condensing pipeline.
+
+condense_data and condense_data_batch take a stats argument. Given a
+PipelineStats, they do their work a chunk of rows at a time, with the same
+converters as usual, timing each stage separately (reading and decoding the
+csv, converting, writing) and counting rows; without one they run their
+usual loop, untouched:
+
+    stats = PipelineStats('NYC')
+    condense_data(in_file, out_file, 'NYC', stats=stats)
+    print(stats)                          # table of the stages
+    stats.write_json('condense.jsonl')    # one JSON line per run
+
+Working in chunks changes the order of the work, so compare the shares of
+the stages rather than the absolute numbers with an uninstrumented run.
+profile runs any function under cProfile and prints the hottest calls.
+"""
+
+import json
+import os
+import sys
+import time
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class PipelineStats:
+    """
+    Cumulative time per stage, rows, bytes read and written and peak memory
+    of one run of the pipeline.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.stages = {}
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_memory_mb = None
+        self.started = time.perf_counter()
+        self.finished = None
+        self._last = self.started
+
+    def lap(self, stage=None):
+        """
+        Add the time since the previous lap to stage; with no stage, only
+        restart the clock.
+        """
+        now = time.perf_counter()
+        if stage is not None:
+            self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def finish(self, in_file=None, out_file=None):
+        """Record the end time, file sizes and peak memory of the run."""
+        self.finished = time.perf_counter()
+        if in_file is not None:
+            self.bytes_read += os.path.getsize(in_file)
+        if out_file is not None:
+            self.bytes_written += os.path.getsize(out_file)
+        self.peak_memory_mb = peak_memory_mb()
+        return self
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_sec(self):
+        seconds = self.seconds
+        return self.rows / seconds if seconds else 0.0
+
+    def as_dict(self):
+        return {'name': self.name, 'rows': self.rows,
+                'seconds': self.seconds, 'rows_per_sec': self.rows_per_sec,
+                'bytes_read': self.bytes_read,
+                'bytes_written': self.bytes_written,
+                'peak_memory_mb': self.peak_memory_mb,
+                'stages': dict(self.stages)}
+
+    def write_json(self, path):
+        """Append the stats to a JSON lines file."""
+        with open(path, 'a') as f_out:
+            f_out.write(json.dumps(self.as_dict()) + '\n')
+
+    def __str__(self):
+        lines = ['{}: {} rows in {:.2f} s ({:.0f} rows/s), {:.1f} MB read, '
+                 '{:.1f} MB written, peak memory {}'.format(
+                     self.name, self.rows, self.seconds, self.rows_per_sec,
+                     self.bytes_read / 1e6, self.bytes_written / 1e6,
+                     'unknown' if self.peak_memory_mb is None
+                     else '{:.0f} MB'.format(self.peak_memory_mb))]
+        total = sum(self.stages.values()) or 1.0
+        for stage, seconds in sorted(self.stages.items(),
+                                     key=lambda item: -item[1]):
+            lines.append('    {:<12} {:8.3f} s {:5.1f}%'.format(
+                stage, seconds, 100 * seconds / total))
+        return '\n'.join(lines)
+
+
+def profile(function, *args, sort='cumulative', limit=30, stream=None,
+            **kwargs):
+    """
+    Run function(*args, **kwargs) under cProfile, print its limit hottest
+    calls sorted by sort (a pstats key such as 'cumulative' or 'tottime')
+    and return the function's result.
+    """
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        pstats.Stats(profiler, stream=stream or sys.stdout) \
+            .sort_stats(sort).print_stats(limit)
@@ -0,0 +1,209 @@
+"""
+Incremental condensing.
+
+Next to every summary CSV a small JSON manifest records which input it was
+condensed from: the input's size, modification time and SHA-256, the city,
+and the version of the condensing logic. On the next run:
+
+- if nothing changed, the input is not condensed again;
+- if the input only grew (its old bytes are unchanged and ended with a line
+  break), only the appended trips are condensed and added to the summary,
+  and to its columnar cache and cube if they were up to date (uncompressed
+  files only);
+- otherwise, or if the summary itself was changed, everything is redone.
+
+A skipped summary still gets the columnar cache and cube asked for if it
+lacks them or they are older than it.
+
+Bump CONDENSE_VERSION whenever the condensed output would change for the
+same input, so that existing summaries are rebuilt.
+"""
+
+import hashlib
+import json
+import os
+
+from .cache import invalidate
+from .columnar import append_columnar, has_columnar, write_columnar
+from .compression import compression_of
+from .cube import append_cube, build_cube, has_cube
+from .parallel import condense_range, read_header
+from .vectorized import condense_data_batch
+
+CONDENSE_VERSION = 1
+
+_BLOCK_SIZE = 1 << 20
+
+
+def manifest_path(out_file):
+    """Return the path of the manifest that belongs to a summary CSV."""
+    return os.path.splitext(out_file)[0] + '.manifest.json'
+
+
+def load_manifest(out_file):
+    """Return the manifest of a summary as a dictionary, or None."""
+    try:
+        with open(manifest_path(out_file), 'r') as f_in:
+            return json.load(f_in)
+    except (OSError, ValueError):
+        return None
+
+
+def file_fingerprint(path, prefix_size=None):
+    """
+    Size, modification time and SHA-256 of a file. If prefix_size is given,
+    the SHA-256 of the first prefix_size bytes is computed in the same read
+    and returned as 'prefix_sha256'.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    prefix_digest = None
+    position = 0
+    with open(path, 'rb') as f_in:
+        for block in iter(lambda: f_in.read(_BLOCK_SIZE), b''):
+            if prefix_size is not None and prefix_digest is None:
+                if position + len(block) >= prefix_size:
+                    digest.update(block[:prefix_size - position])
+                    prefix_digest = digest.hexdigest()
+                    digest.update(block[prefix_size - position:])
+                    position += len(block)
+                    continue
+            digest.update(block)
+            position += len(block)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                   'sha256': digest.hexdigest()}
+    if prefix_size is not None:
+        fingerprint['prefix_sha256'] = prefix_digest
+    return fingerprint
+
+
+def _ends_line(path, offset):
+    """True if the byte just before offset in path is a line break."""
+    with open(path, 'rb') as f_in:
+        f_in.seek(offset - 1)
+        return f_in.read(1) == b'\n'
+
+
+def plan_condense(in_file, out_file, city):
+    """
+    Decide how to bring a summary up to date with its input. Returns an
+    (action, offset, fingerprint) tuple where action is 'skip', 'append' or
+    'full', offset is the byte offset in in_file to start condensing from
+    when appending, and fingerprint is the new input fingerprint to save
+    with save_manifest once condensing is done.
+    """
+    manifest = load_manifest(out_file)
+    if (manifest is None or not os.path.exists(out_file)
+            or manifest.get('version') != CONDENSE_VERSION
+            or manifest.get('city') != city
+            or manifest.get('in_file') != in_file):
+        return ('full', 0, None)
+
+    old = manifest['input']
+    summary = os.stat(out_file)
+    if (summary.st_size != manifest['output']['size']
+            or summary.st_mtime != manifest['output']['mtime']):
+        return ('full', 0, None)
+
+    stat = os.stat(in_file)
+    if stat.st_size == old['size'] and stat.st_mtime == old['mtime']:
+        return ('skip', 0, None)
+
+    fingerprint = file_fingerprint(in_file, prefix_size=old['size'])
+    if fingerprint['sha256'] == old['sha256']:
+        # touched, but the content is the same
+        return ('skip', 0, fingerprint)
+    if (fingerprint['size'] > old['size'] and not compression_of(in_file)
+            and not compression_of(out_file)
+            and fingerprint['prefix_sha256'] == old['sha256']
+            and _ends_line(in_file, old['size'])):
+        return ('append', old['size'], fingerprint)
+    return ('full', 0, fingerprint)
+
+
+def save_manifest(in_file, out_file, city, fingerprint=None):
+    """Record that out_file is now up to date with in_file."""
+    if fingerprint is None:
+        fingerprint = file_fingerprint(in_file)
+    fingerprint.pop('prefix_sha256', None)
+    summary = os.stat(out_file)
+    manifest = {'version': CONDENSE_VERSION, 'city': city, 'in_file': in_file,
+                'input': fingerprint,
+                'output': {'size': summary.st_size,
+                           'mtime': summary.st_mtime}}
+    with open(manifest_path(out_file), 'w') as f_out:
+        json.dump(manifest, f_out, indent=2)
+
+
+def complete_outputs(out_file, columnar=False, cube=False):
+    """
+    Build the columnar cache and cube of an up to date summary, if asked
+    to and they are missing or stale. Returns True if anything was built.
+    """
+    built = False
+    if columnar and not has_columnar(out_file):
+        write_columnar(out_file)
+        built = True
+    if cube and not has_cube(out_file):
+        build_cube(out_file)
+        built = True
+    return built
+
+
+def summary_state(out_file):
+    """
+    The size of a summary and whether its columnar cache and cube are up to
+    date, taken just before trips are appended to it (see
+    update_appended_outputs).
+    """
+    return {'size': os.path.getsize(out_file),
+            'columnar': has_columnar(out_file), 'cube': has_cube(out_file)}
+
+
+def update_appended_outputs(out_file, state, columnar=False, cube=False):
+    """
+    Bring the columnar cache and cube of a summary up to date, if asked to,
+    once trips were appended to it. state is what summary_state returned
+    before the append: a cache or cube that was up to date then only gets
+    the appended trips added, the others are rebuilt.
+    """
+    if columnar:
+        if state['columnar']:
+            append_columnar(out_file, state['size'])
+        else:
+            write_columnar(out_file)
+    if cube:
+        if state['cube']:
+            append_cube(out_file, state['size'])
+        else:
+            build_cube(out_file)
+
+
+def condense_incremental(in_file, out_file, city, columnar=False, cube=False):
+    """
+    Bring out_file up to date with in_file, condensing only what changed
+    since the last run, and rebuild its columnar cache and cube if asked
+    to (extend them after an append, see update_appended_outputs, or just
+    build them if the summary is up to date but lacks them, see
+    complete_outputs). Returns the action taken: 'skip', 'append' or
+    'full'.
+    """
+    action, offset, fingerprint = plan_condense(in_file, out_file, city)
+    if action == 'skip':
+        if fingerprint is not None:
+            save_manifest(in_file, out_file, city, fingerprint)
+        complete_outputs(out_file, columnar, cube)
+        return action
+
+    if action == 'append':
+        header, _ = read_header(in_file)
+        state = summary_state(out_file)
+        condense_range(in_file, out_file, city, header, offset,
+                       fingerprint['size'], mode='a')
+        update_appended_outputs(out_file, state, columnar, cube)
+        invalidate(out_file)
+    else:
+        condense_data_batch(in_file, out_file, city, columnar=columnar,
+                            cube=cube)
+    save_manifest(in_file, out_file, city, fingerprint)
+    return action
@@ -0,0 +1,157 @@
+"""
+Memory-mapped reading of uncompressed CSV files as raw bytes.
+
+The text layer decodes every byte to str and the csv module then splits it
+again, even when only a row count or a few numbers are wanted. Here the file
+is mapped into memory and scanned in line-aligned windows of bytes:
+
+    first_record    header and first row, without reading anything more
+    count_rows      rows after the header, counting line breaks
+                    (blank lines are not rows)
+    read_summary    a summary's columns, numbers parsed straight from bytes
+
+Only one window (WINDOW bytes) is copied out of the map at a time, so files
+larger than RAM are read without paging them all into the Python heap.
+line_blocks, line_end, split_rows and count_lines are the pieces these are
+built from, also used by bikeshare.estimate.
+Fields are split on commas, so this suits files whose rows hold no quoted
+fields, such as the condensed summaries; first_record goes through the csv
+module and takes any header and first row.
+"""
+
+import csv
+import io
+import mmap
+import os
+
+WINDOW = 16 << 20
+
+
+class _Empty(bytes):
+    """Stands in for the map of an empty file, which mmap refuses."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Strings(dict):
+    """Decodes byte strings once and hands back the same str afterwards."""
+
+    def __missing__(self, key):
+        value = self[key] = key.decode()
+        return value
+
+
+def map_file(path):
+    """
+    Map the whole file at path read-only. An empty file, which cannot be
+    mapped, gives empty bytes that can be used the same way.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _Empty()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, 'madvise'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+def line_blocks(mapped, start=0, window=WINDOW):
+    """
+    Yield byte blocks of whole lines from start to the end of mapped, each
+    at most about window bytes long (longer only for a longer line).
+    """
+    size = len(mapped)
+    while start < size:
+        end = min(start + window, size)
+        if end < size:
+            cut = mapped.rfind(b'\n', start, end)
+            if cut < 0:
+                cut = mapped.find(b'\n', end)
+            end = size if cut < 0 else cut + 1
+        yield mapped[start:end]
+        start = end
+
+
+def line_end(mapped, start=0):
+    """Offset just past the line break ending the line at start."""
+    end = mapped.find(b'\n', start)
+    return len(mapped) if end < 0 else end + 1
+
+
+def split_rows(block, separator=b'\n'):
+    """
+    The lines of a block of whole lines split at separator, without the
+    blank ones csv.DictReader skips: empty lines, and the b'\\r' left of a
+    blank '\\r\\n' line in a file of '\\n' lines.
+    """
+    return [line for line in block.split(separator)
+            if line and line != b'\r']
+
+
+def count_lines(block):
+    """
+    Number of lines of a block of whole lines (the last one may lack its
+    line break) that are not blank, as csv.DictReader counts them. Blocks
+    without a blank line, the usual case, are counted from their line
+    breaks alone.
+    """
+    if (b'\n\n' in block or b'\n\r\n' in block or block.endswith(b'\n\r')
+            or block[:1] == b'\n' or block[:2] == b'\r\n'
+            or block == b'\r'):
+        return len(split_rows(block))
+    n_lines = block.count(b'\n')
+    if block and not block.endswith(b'\n'):
+        # a final line without a line break
+        n_lines += 1
+    return n_lines
+
+
+def first_record(path):
+    """
+    Return the first row of a csv file with a header row as a dictionary,
+    like the first row of a csv.DictReader, reading only those two lines.
+    """
+    with map_file(path) as mapped:
+        lines = bytes(mapped[:line_end(mapped, line_end(mapped))])
+    return next(csv.DictReader(io.TextIOWrapper(io.BytesIO(lines))))
+
+
+def count_rows(path, window=WINDOW):
+    """
+    Count the rows of a csv file after its header row by counting line
+    breaks, without parsing any of them. Blank lines are skipped, as
+    csv.DictReader does.
+    """
+    with map_file(path) as mapped:
+        n_lines = sum(count_lines(block)
+                      for block in line_blocks(mapped, window=window))
+    return max(n_lines - 1, 0)
+
+
+def read_summary(path, columns, types=None, window=WINDOW):
+    """
+    Yield a tuple of the given columns for every row of a csv file without
+    quoted fields, like reader.read_columns. types holds a function for each
+    column that is applied to its bytes (float and int take bytes as they
+    are); None decodes the field to a str, keeping one copy of each value.
+    """
+    from .reader import row_converter
+
+    strings = _Strings()
+    types = list(types) if types else [None] * len(columns)
+    types = [strings.__getitem__ if convert is None else convert
+             for convert in types]
+    with map_file(path) as mapped:
+        header_end = line_end(mapped)
+        header_line = bytes(mapped[:header_end])
+        separator = b'\r\n' if header_line.endswith(b'\r\n') else b'\n'
+        header = header_line.decode().rstrip('\r\n').split(',')
+        convert = row_converter([header.index(column) for column in columns],
+                                types)
+        for block in line_blocks(mapped, header_end, window):
+            for row in split_rows(block, separator):
+                yield convert(row.split(b','))
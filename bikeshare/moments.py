@@ -0,0 +1,204 @@
+"""
+Mergeable running statistics of trip durations, by group.
+
+func and func2 give one mean each. A Moments accumulator keeps the count,
+mean, variance, minimum and maximum of a stream of durations in one pass:
+each value updates the mean and the sum of squared deviations from it
+(Welford, "Note on a Method for Calculating Corrected Sums of Squares and
+Products", 1962), which avoids the cancellation of the textbook sum of
+squares formula on millions of trips. Two accumulators are merged exactly
+(Chan, Golub and LeVeque, "Updating Formulae and a Pairwise Algorithm for
+Computing Sample Variances", 1979), so accumulators of chunks, files,
+worker processes or cities combine into those of all their trips:
+
+    groups = duration_moments('./data/NYC-2016-Summary.csv',
+                              by=('user_type', 'month'))
+    groups['Customer', 7].mean, groups['Customer', 7].std
+
+    city_moments({'NYC': ..., 'Chicago': ...}, by=('user_type',))
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+from .aggregate import Aggregator
+from .columnar import DAYS_OF_WEEK
+
+# the trip fields a group can be keyed by, in update's argument order
+GROUP_FIELDS = ('month', 'hour', 'day_of_week', 'user_type')
+
+
+class Moments:
+    """Count, mean, variance, minimum and maximum of a stream of numbers."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        # sum of squared deviations from the mean
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        """Add one value."""
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def extend(self, values):
+        """Add a sequence of values."""
+        for value in values:
+            self.add(value)
+
+    def merge_parts(self, n, mean, m2, minimum, maximum):
+        """Merge the moments of other values, given as their parts."""
+        if not n:
+            return self
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+        return self
+
+    def merge(self, other):
+        """Add all the values summarised by another Moments to this one."""
+        return self.merge_parts(other.n, other.mean, other.m2, other.min,
+                                other.max)
+
+    @property
+    def variance(self):
+        """Population variance, or nan without values."""
+        return self.m2 / self.n if self.n else math.nan
+
+    @property
+    def sample_variance(self):
+        """Sample (n - 1) variance, or nan with fewer than two values."""
+        return self.m2 / (self.n - 1) if self.n > 1 else math.nan
+
+    @property
+    def std(self):
+        """Population standard deviation, or nan without values."""
+        return math.sqrt(self.variance)
+
+    def result(self):
+        """The statistics as a dictionary; nan for the mean of no values."""
+        if not self.n:
+            return {'count': 0, 'mean': math.nan, 'variance': math.nan,
+                    'std': math.nan, 'min': math.nan, 'max': math.nan}
+        return {'count': self.n, 'mean': self.mean,
+                'variance': self.variance, 'std': self.std,
+                'min': self.min, 'max': self.max}
+
+    def __repr__(self):
+        return 'Moments(n={}, mean={!r}, std={!r}, min={!r}, max={!r})'.format(
+            self.n, self.mean if self.n else math.nan, self.std,
+            self.min, self.max)
+
+
+class DurationMoments:
+    """
+    Aggregator statistic: the Moments of trip durations for each group of
+    trips sharing the fields in by (some of GROUP_FIELDS). The result maps
+    a tuple of those fields' values to the group's Moments; by=() gives one
+    group keyed by ().
+    """
+
+    def __init__(self, by=('user_type',)):
+        for field in by:
+            if field not in GROUP_FIELDS:
+                raise ValueError('unknown group field: {}'.format(field))
+        self.by = tuple(by)
+        self._indices = [GROUP_FIELDS.index(field) for field in self.by]
+        self.groups = {}
+
+    def _group(self, key):
+        moments = self.groups.get(key)
+        if moments is None:
+            moments = self.groups[key] = Moments()
+        return moments
+
+    def update(self, duration, month, hour, day_of_week, user_type):
+        fields = (month, hour, day_of_week, user_type)
+        self._group(tuple(fields[i] for i in self._indices)).add(duration)
+
+    def update_columns(self, cols):
+        import numpy as np
+
+        if not len(cols):
+            return
+        duration = cols.duration.astype('f8')
+        if self.by:
+            codes = np.stack([np.asarray(getattr(cols, field), dtype='i8')
+                              for field in self.by], axis=1)
+            keys, group = np.unique(codes, axis=0, return_inverse=True)
+            group = group.ravel()
+        else:
+            keys, group = np.zeros((1, 0), dtype='i8'), np.zeros(
+                len(duration), dtype='i8')
+        # the moments of each group of this block, merged into the totals
+        counts = np.bincount(group, minlength=len(keys))
+        means = np.bincount(group, duration, len(keys)) / counts
+        m2s = np.bincount(group, (duration - means[group]) ** 2, len(keys))
+        minima = np.full(len(keys), np.inf)
+        np.minimum.at(minima, group, duration)
+        maxima = np.full(len(keys), -np.inf)
+        np.maximum.at(maxima, group, duration)
+        for i, key in enumerate(keys.tolist()):
+            key = tuple(self._decode(field, code, cols)
+                        for field, code in zip(self.by, key))
+            self._group(key).merge_parts(
+                int(counts[i]), float(means[i]), float(m2s[i]),
+                float(minima[i]), float(maxima[i]))
+
+    @staticmethod
+    def _decode(field, code, cols):
+        if field == 'day_of_week':
+            return DAYS_OF_WEEK[code]
+        if field == 'user_type':
+            return cols.user_types[code]
+        return code
+
+    def merge(self, other):
+        """Merge the groups of another DurationMoments with the same by."""
+        for key, moments in other.groups.items():
+            self._group(key).merge(moments)
+        return self
+
+    def result(self):
+        return dict(sorted(self.groups.items()))
+
+
+def duration_moments(file, by=('user_type',)):
+    """
+    The Moments of the trip durations of a summary file for each group of
+    trips sharing the fields in by, in one pass: {key tuple: Moments}.
+    """
+    agg = Aggregator()
+    stat = agg.add('moments', DurationMoments(by))
+    agg.run(file)
+    return stat.result()
+
+
+def city_moments(city_files, by=('user_type',), workers=None):
+    """
+    duration_moments of every {city: summary file}, computed in a pool of
+    workers processes (default: one per CPU), keyed by (city,) + key. The
+    Moments of several keys can be merged into those of their trips
+    together, e.g. of every city.
+    """
+    groups = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {city: pool.submit(duration_moments, file, by)
+                   for city, file in city_files.items()}
+        for city, future in futures.items():
+            for key, moments in future.result().items():
+                groups[(city,) + key] = moments
+    return groups
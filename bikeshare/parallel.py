@@ -0,0 +1,322 @@
+"""
+Parallel condensing of several cities and of large single files.
+
+Each input file is cut into byte ranges whose boundaries are moved forward to
+the next line break, so that every range holds whole trips. The ranges of all
+cities are condensed by a pool of worker processes into temporary part
+files, which are then concatenated in order behind the header. The result is
+identical to condensing each file serially.
+
+Trip rows are assumed not to contain quoted line breaks, which holds for the
+Motivate trip files.
+
+Compressed inputs with a block index (see bikeshare.compression) are split
+at block boundaries instead, and each worker decompresses its own blocks.
+Compressed inputs without an index are condensed as one stream by a single
+worker. A compressed output is written by compressing every part in its
+worker; the parts are then joined as consecutive compressed blocks. If a
+worker fails, the part files are removed before the error is raised.
+"""
+
+import csv
+import io
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from .cache import invalidate
+from .columnar import has_columnar, write_columnar
+from .compression import (compression_of, load_index, open_text, read_blocks,
+                          save_index)
+from .cube import build_cube, has_cube
+from .quarantine import Quarantine, quarantine_path
+from .schema import get_schema
+from .vectorized import condense_quarantined, condense_rows, read_trip_columns
+from .wrangling import OUT_COLNAMES
+
+
+def read_header(in_file):
+    """
+    Return the header row of a csv file and the byte offset after it (0 for
+    compressed files, whose first block holds the header).
+    """
+    if compression_of(in_file):
+        with open_text(in_file, readahead=False) as f_in:
+            return next(csv.reader(f_in)), 0
+    with open(in_file, 'rb') as f_in:
+        line = f_in.readline()
+        offset = f_in.tell()
+    return next(csv.reader(io.TextIOWrapper(io.BytesIO(line)))), offset
+
+
+def chunk_offsets(in_file, n_chunks, start=0, end=None):
+    """
+    Split the bytes of in_file from start to end (default: the end of the
+    file) into at most n_chunks (begin, end) ranges that each start at the
+    beginning of a line.
+    """
+    size = os.path.getsize(in_file) if end is None else end
+    bounds = [start]
+    with open(in_file, 'rb') as f_in:
+        for i in range(1, n_chunks):
+            pos = start + (size - start) * i // n_chunks
+            if pos <= bounds[-1]:
+                continue
+            f_in.seek(pos - 1)
+            # finish the line that pos falls in
+            f_in.readline()
+            pos = f_in.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(begin, end) for begin, end in zip(bounds, bounds[1:])
+            if end > begin]
+
+
+def split_input(in_file, n_chunks, start=0, end=None):
+    """
+    Split in_file into at most n_chunks (begin, end) byte ranges of whole
+    lines, from start to end (a line-aligned offset, by default the end of
+    the file). Compressed files are split at block boundaries, whatever
+    start and end; an unindexed compressed file is a single (0, None)
+    range.
+    """
+    if not compression_of(in_file):
+        return chunk_offsets(in_file, n_chunks, start, end)
+    blocks = load_index(in_file)
+    if blocks is None:
+        return [(0, None)]
+    n_chunks = min(n_chunks, len(blocks))
+    groups = [blocks[len(blocks) * i // n_chunks:len(blocks) * (i + 1) // n_chunks]
+              for i in range(n_chunks)]
+    return [(group[0][0], group[-1][1]) for group in groups]
+
+
+def _open_range(in_file, begin, end):
+    """Open the lines stored between two byte offsets of in_file as text."""
+    if not compression_of(in_file):
+        with open(in_file, 'rb') as f_in:
+            f_in.seek(begin)
+            data = f_in.read(end - begin)
+        return io.TextIOWrapper(io.BytesIO(data))
+    if end is None:
+        f_in = open_text(in_file)
+    else:
+        f_in = io.TextIOWrapper(io.BytesIO(read_blocks(in_file, begin, end)))
+    if begin == 0:
+        # the first block starts with the header
+        f_in.readline()
+    return f_in
+
+
+def condense_range(in_file, part_file, city, header, begin, end, mode='w',
+                   quarantine=None):
+    """
+    Condense the trips stored between two line-aligned byte offsets of
+    in_file (see split_input), whose columns are named by header, and write
+    them, without a header, to part_file (appending to it if mode is 'a').
+    Given a Quarantine, bad rows are written to it, with their line numbers
+    counted from the start of the range, and its n_rows is set to the
+    number of lines in the range.
+    """
+    with _open_range(in_file, begin, end) as f_in, \
+            open_text(part_file, mode) as f_out:
+        if quarantine is None:
+            trips = read_trip_columns(f_in, city, header)
+            condense_rows(trips, csv.writer(f_out), city)
+        else:
+            quarantine.check(condense_quarantined(
+                f_in, csv.writer(f_out), city, quarantine, header))
+    return part_file
+
+
+def _condense_range_quarantined(in_file, part_file, city, header, begin,
+                                end):
+    """condense_range in a worker, with a Quarantine of its own."""
+    with Quarantine(part_file + '.rejected.csv') as quarantine:
+        condense_range(in_file, part_file, city, header, begin, end,
+                       quarantine=quarantine)
+    return part_file, quarantine
+
+
+def _lines_before(in_file, offset):
+    """Number of lines of in_file before the line-aligned byte offset."""
+    if offset == 0:
+        # the first range of a compressed file starts with the header
+        return 1
+    n_lines = 0
+    with open(in_file, 'rb') as f_in:
+        while offset > 0:
+            block = f_in.read(min(offset, 1 << 20))
+            if not block:
+                break
+            n_lines += block.count(b'\n')
+            offset -= len(block)
+    return n_lines
+
+
+def _part_file(out_file, i):
+    """Name of a part file, compressed like out_file."""
+    ext = compression_of(out_file) or ''
+    return '{}.part{}{}'.format(out_file[:len(out_file) - len(ext)], i, ext)
+
+
+def condense_parallel(city_info, workers=None, chunks_per_file=None,
+                      columnar=False, incremental=False, cube=False,
+                      quarantine=None):
+    """
+    Condense every city in city_info (the same dictionary the notebook
+    uses) with a pool of worker processes. workers defaults to the number of
+    CPUs and each file is split into chunks_per_file pieces (default:
+    workers). If columnar is True the columnar caches are built too, and
+    if cube is True so are the cubes (see bikeshare.cube).
+
+    If incremental is True, summaries whose input has not changed since the
+    last run are skipped and inputs that only grew have just their new trips
+    condensed, and added to the columnar caches and cubes (see
+    bikeshare.manifest); skipped summaries still get the columnar caches
+    and cubes asked for if they lack them. Returns the action taken for
+    each city: 'full', 'append' or 'skip'.
+
+    Bad rows raise, unless quarantine is True, for a Quarantine writing to
+    quarantine_path(out_file) for each city, or a {city: Quarantine}
+    dictionary whose Quarantines then hold the counts (cities missing from
+    it are not quarantined; see bikeshare.quarantine). Every worker
+    quarantines the rows of its range and the ranges of a city are merged
+    in order; a city with too many bad rows raises TooManyBadRows once all
+    its rows are read. A summary that is only appended to gets a side file
+    of the appended rows' rejects.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks_per_file = chunks_per_file or workers
+    # the Quarantines of the cities condensed, filled in as they start
+    quarantines = {}
+    part_files = []
+    try:
+        return _condense_cities(city_info, workers, chunks_per_file,
+                                columnar, incremental, cube, quarantine,
+                                quarantines, part_files)
+    except BaseException:
+        for path in part_files:
+            for leftover in (path, path + '.rejected.csv'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        raise
+    finally:
+        for city_quarantine in quarantines.values():
+            city_quarantine.close()
+
+
+def _condense_cities(city_info, workers, chunks_per_file, columnar,
+                     incremental, cube, quarantine, quarantines, part_files):
+    """
+    The work of condense_parallel, keeping the Quarantine of every city
+    condensed in quarantines and naming every part file in part_files.
+    """
+    from .manifest import (plan_condense, save_manifest, summary_state,
+                           update_appended_outputs)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            plans = {}
+            parts = {}
+            # the input line each city's next range starts on
+            first_lines = {}
+            # the state of each summary appended to, before the append
+            appended = {}
+            for city, filenames in city_info.items():
+                in_file, out_file = filenames['in_file'], filenames['out_file']
+                if incremental:
+                    plans[city] = plan_condense(in_file, out_file, city)
+                else:
+                    plans[city] = ('full', 0, None)
+                action, start, fingerprint = plans[city]
+                if action == 'skip':
+                    continue
+
+                header, offset = read_header(in_file)
+                start = max(start, offset)
+                # stop where the input was fingerprinted, so that trips
+                # written to it since are left for the next run
+                end = fingerprint['size'] if fingerprint else None
+                ranges = split_input(in_file, chunks_per_file, start, end)
+                part_files.extend(_part_file(out_file, i)
+                                  for i in range(len(ranges)))
+                worker = condense_range
+                if quarantine is True:
+                    quarantines[city] = Quarantine(quarantine_path(out_file))
+                elif quarantine and city in quarantine:
+                    quarantines[city] = quarantine[city]
+                if city in quarantines:
+                    worker = _condense_range_quarantined
+                    first_lines[city] = _lines_before(in_file, start) + 1
+                parts[city] = [
+                    # the schema itself is sent, so workers need not know
+                    # schemas registered in this process
+                    pool.submit(worker, in_file, _part_file(out_file, i),
+                                get_schema(city), header, begin, end)
+                    for i, (begin, end) in enumerate(ranges)]
+
+            # stitch the parts of each city together in file order
+            for city, futures in parts.items():
+                out_file = city_info[city]['out_file']
+                if plans[city][0] == 'full':
+                    with open_text(out_file, 'w') as f_out:
+                        csv.writer(f_out).writerow(OUT_COLNAMES)
+                else:
+                    appended[city] = summary_state(out_file)
+                # parts are copied as bytes so line endings are left
+                # untouched, and compressed parts simply follow each other
+                # as blocks
+                with open(out_file, 'ab') as f_out:
+                    offsets = [0, f_out.tell()]
+                    for future in futures:
+                        part_file = future.result()
+                        if city in quarantines:
+                            part_file, part = part_file
+                            quarantines[city].merge(part, first_lines[city])
+                            first_lines[city] += part.n_rows
+                        with open(part_file, 'rb') as f_part:
+                            shutil.copyfileobj(f_part, f_out)
+                        offsets.append(f_out.tell())
+                        os.remove(part_file)
+                if compression_of(out_file) and plans[city][0] == 'full':
+                    save_index(out_file, offsets)
+                if city in quarantines:
+                    quarantines[city].check(quarantines[city].n_rows)
+        except BaseException:
+            # don't start the ranges still waiting for a worker
+            pool.shutdown(cancel_futures=True)
+            raise
+
+        # summaries appended to extend the artifacts they had, and skipped
+        # summaries only need the artifacts they lack
+        out_files = {city: city_info[city]['out_file'] for city in plans}
+        futures = []
+        if columnar or cube:
+            futures += [pool.submit(update_appended_outputs, out_files[city],
+                                    state, columnar, cube)
+                        for city, state in appended.items()]
+        if columnar:
+            futures += [pool.submit(write_columnar, out_file)
+                        for city, out_file in out_files.items()
+                        if city not in appended
+                        and (city in parts or not has_columnar(out_file))]
+        if cube:
+            futures += [pool.submit(build_cube, out_file)
+                        for city, out_file in out_files.items()
+                        if city not in appended
+                        and (city in parts or not has_cube(out_file))]
+        for future in futures:
+            future.result()
+    for city in parts:
+        invalidate(city_info[city]['out_file'])
+
+    if incremental:
+        for city, (action, _, fingerprint) in plans.items():
+            if action != 'skip' or fingerprint is not None:
+                save_manifest(city_info[city]['in_file'],
+                              city_info[city]['out_file'], city, fingerprint)
+    return {city: plan[0] for city, plan in plans.items()}
@@ -0,0 +1,158 @@
+"""
+Quarantine of raw rows that cannot be condensed.
+
+Real feeds hold the odd row with an empty duration, a malformed start time
+or an unexpected user type, and one of them would otherwise stop
+condense_data with an exception halfway through a file. Given a Quarantine,
+condense_data writes such rows to a side file instead, with their line
+number and the reason, counts them by reason, and carries on:
+
+    quarantine = Quarantine('NYC-2016-Summary.rejected.csv',
+                            max_error_rate=0.01)
+    condense_data(in_file, out_file, 'NYC', quarantine=quarantine)
+    quarantine.n_bad, quarantine.reasons
+
+The row loop itself is unchanged: a bad row raises as before, the exception
+is caught outside the loop, and the loop resumes on the next row, so clean
+rows cost nothing more. Rows are only examined when one has failed, to find
+out why. With max_error_rate, condensing stops with TooManyBadRows as soon
+as more than that share of the rows read so far (after the first min_rows)
+have been bad, and again over the whole file once it is read.
+
+condense_data_batch and condense_parallel take a quarantine too. The batch
+path converts whole chunks as before and only goes through a chunk one row
+at a time when it holds a bad row. Each worker of condense_parallel keeps
+its own Quarantine for its piece of the file, and the pieces are merged in
+file order (Quarantine.merge), so the side file and counts are those of
+the whole input; the limit is then checked once, over all of it.
+"""
+
+import csv
+import os
+from collections import Counter
+
+from .compression import open_text
+
+QUARANTINE_COLNAMES = ['line', 'reason', 'row']
+
+
+class TooManyBadRows(ValueError):
+    """More rows of a file were bad than the quarantine's max_error_rate."""
+
+
+def quarantine_path(out_file):
+    """Return the path of the side file of rows rejected for out_file."""
+    return os.path.splitext(out_file)[0] + '.rejected.csv'
+
+
+def diagnose(schema, header, row, error):
+    """The reason a raw row of a file with the given header failed."""
+    if row is None:
+        return 'unreadable row: {}'.format(error)
+    columns = [header.index(column) for column in schema.columns]
+    if len(row) <= max(columns):
+        return 'missing fields'
+    duration, start, user_type = (row[column] for column in columns)
+    try:
+        int(duration) / schema.units_per_minute
+    except (ValueError, ArithmeticError):
+        return 'bad {}'.format(schema.duration_column)
+    try:
+        schema.parse_start_time(start)
+    except (ValueError, IndexError, KeyError):
+        return 'bad {}'.format(schema.start_column)
+    if user_type not in schema.known_user_types:
+        return 'unexpected {}'.format(schema.user_type_column)
+    return '{}: {}'.format(type(error).__name__, error)
+
+
+class Quarantine:
+    """
+    Side file and counters of the rows rejected while condensing one file,
+    with an optional limit on their share of the rows.
+    """
+
+    def __init__(self, path, max_error_rate=None, min_rows=1000):
+        self.path = path
+        self.max_error_rate = max_error_rate
+        self.min_rows = min_rows
+        self.n_bad = 0
+        self.n_rows = 0
+        self.reasons = Counter()
+        self._file = None
+        self._writer = None
+        self._checked = False
+
+    def reject(self, line, row, reason, rows_read):
+        """
+        Record a bad row, found at line of the input after rows_read rows,
+        and raise TooManyBadRows if there are too many of them.
+        """
+        self._write([line, reason] + list(row or []))
+        self.n_bad += 1
+        self.reasons[reason.split(':')[0]] += 1
+        if rows_read >= self.min_rows:
+            self.check(rows_read)
+
+    def _write(self, record):
+        if self._writer is None:
+            self._file = open_text(self.path, 'w')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(QUARANTINE_COLNAMES)
+        self._writer.writerow(record)
+
+    def merge(self, part, first_line=1):
+        """
+        Add the rows rejected by part, the closed Quarantine of a piece of
+        the same input whose first line is line first_line of the input,
+        and remove part's side file. The limit is not checked: call check
+        once every piece is merged.
+        """
+        if part.n_bad:
+            with open_text(part.path) as f_in:
+                rejected = csv.reader(f_in)
+                next(rejected)
+                for line, reason, *row in rejected:
+                    self._write([int(line) + first_line - 1, reason] + row)
+            os.remove(part.path)
+        self.n_bad += part.n_bad
+        self.reasons.update(part.reasons)
+        self.n_rows += part.n_rows
+
+    def check(self, rows_read):
+        """Raise TooManyBadRows if too many of rows_read rows were bad."""
+        self.n_rows = rows_read
+        self._checked = True
+        if (self.max_error_rate is not None and rows_read
+                and self.n_bad / rows_read > self.max_error_rate):
+            self.close()
+            raise TooManyBadRows(
+                '{} of {} rows are bad, more than {:.2%}: {}'.format(
+                    self.n_bad, rows_read, self.max_error_rate,
+                    dict(self.reasons)))
+
+    @property
+    def error_rate(self):
+        return self.n_bad / self.n_rows if self.n_rows else 0.0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = self._writer = None
+        elif self._checked and not self.n_bad and os.path.exists(self.path):
+            # the side file is only written if a row is bad, so don't leave
+            # the one of an earlier run behind once a file was condensed
+            # without any; a Quarantine that was never used leaves it alone
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __str__(self):
+        return '{} of {} rows quarantined in {} ({:.3%}){}'.format(
+            self.n_bad, self.n_rows, self.path, self.error_rate,
+            ''.join('\n    {:<24} {}'.format(reason, count)
+                    for reason, count in self.reasons.most_common()))
@@ -0,0 +1,58 @@
+"""
+Column-projected CSV reading.
+
+csv.DictReader builds a dictionary of every column for every row, although
+most functions only look at one or two of them. read_columns looks the wanted
+columns up in the header once and yields just those fields as tuples,
+optionally converted to the right types on the way.
+
+    for duration, user_type in read_columns(f, ['duration', 'user_type'],
+                                            [float, None]):
+        ...
+"""
+
+import csv
+
+
+def row_converter(indices, types=None):
+    """
+    Build a function that takes a csv row (a list of strings) and returns
+    the fields at indices as a tuple, each converted by the matching entry
+    of types (None keeps the string). The function is generated as a single
+    expression, like collections.namedtuple does, so no per-field loop runs
+    for each row.
+    """
+    types = list(types) if types else [None] * len(indices)
+    namespace = {}
+    fields = []
+    for n, (i, convert) in enumerate(zip(indices, types)):
+        if convert is None:
+            fields.append('row[{}]'.format(int(i)))
+        else:
+            namespace['convert{}'.format(n)] = convert
+            fields.append('convert{}(row[{}])'.format(n, int(i)))
+    source = 'lambda row: ({},)'.format(', '.join(fields))
+    return eval(source, namespace)
+
+
+def skip_blank(rows):
+    """
+    The rows of a csv reader without its blank lines, which csv.reader
+    yields as empty lists and csv.DictReader skips.
+    """
+    return filter(None, rows)
+
+
+def read_columns(f, columns, types=None, header=None):
+    """
+    Yield a tuple of the given columns for every row of the open csv file f.
+    types, if given, holds a conversion function (or None to keep the
+    string) for each column. header is the list of column names; by default
+    it is read from the first row of f. Blank lines are skipped, as
+    csv.DictReader does.
+    """
+    reader = csv.reader(f)
+    if header is None:
+        header = next(reader)
+    indices = [header.index(column) for column in columns]
+    return map(row_converter(indices, types), skip_blank(reader))
@@ -0,0 +1,195 @@
+"""
+Figures of one city's trips, saved to image files.
+
+The same plots the notebook shows for Chicago: the distribution of trip
+times, the distributions for customers and for subscribers below 75 minutes,
+and ridership by month. matplotlib is only imported when a figure is drawn,
+with the non-interactive Agg backend.
+
+write_report draws them for every city at once, plus a comparison of the
+cities' statistics, with every figure and statistic computed in a pool of
+worker processes, so the time taken follows the number of cores rather than
+the number of city and figure pairs:
+
+    write_report(report_files(city_info), './report', fmt=('png', 'svg'))
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .aggregate import (Aggregator, DurationSummary, UserTypeCounts,
+                        UserTypeMeans)
+from .histogram import Histogram, histogram, plot_histograms
+
+# the figures of each city, by file name suffix
+FIGURES = ['trip-times', 'customer-trip-times', 'subscriber-trip-times',
+           'monthly-ridership']
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plot_trip_times(file, city, path):
+    """Histogram of all trip times."""
+    plt = _pyplot()
+    fig = plt.figure()
+    plot_histograms([histogram(file)], ax=fig.gca())
+    fig.gca().set_xlabel('time')
+    fig.gca().set_title('trip times for {}'.format(city))
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def plot_user_type_trip_times(file, city, user_type, path):
+    """Histogram of the trip times of one user type, in 5 minute bins."""
+    plt = _pyplot()
+    fig = plt.figure()
+    plot_histograms([histogram(file, bins=15, range=[0, 75],
+                               user_type=user_type)], ax=fig.gca())
+    fig.gca().set_xlabel('time')
+    fig.gca().set_title('trip times for {}s in {}'.format(user_type, city))
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def plot_monthly_ridership(file, city, path):
+    """Ridership by month for all users, customers and subscribers."""
+    plt = _pyplot()
+    edges = list(range(14))
+    agg = Aggregator()
+    all_users = agg.add('all', Histogram(edges, 'month'))
+    customers = agg.add('customer', Histogram(edges, 'month', 'Customer'))
+    subscribers = agg.add('subscriber', Histogram(edges, 'month', 'Subscriber'))
+    agg.run(file)
+
+    fig = plt.figure(figsize=(12, 6))
+    ax = fig.gca()
+    plot_histograms([all_users.result(), customers.result(),
+                     subscribers.result()], align='left', ax=ax,
+                    labels=['all users', 'customers', 'subscribers'])
+    ax.legend()
+    ax.set_xticks(range(13))
+    ax.set_xlim([0, 13])
+    ax.set_xlabel('months')
+    ax.set_title('ridership in {} by month'.format(city))
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def plot_figure(name, file, city, path):
+    """Draw one of FIGURES for a city's summary file and save it to path."""
+    if name == 'trip-times':
+        return plot_trip_times(file, city, path)
+    if name == 'customer-trip-times':
+        return plot_user_type_trip_times(file, city, 'Customer', path)
+    if name == 'subscriber-trip-times':
+        return plot_user_type_trip_times(file, city, 'Subscriber', path)
+    if name == 'monthly-ridership':
+        return plot_monthly_ridership(file, city, path)
+    raise ValueError('unknown figure: {}'.format(name))
+
+
+def city_statistics(file):
+    """The notebook's statistics of one summary file, in one pass."""
+    agg = Aggregator()
+    agg.add('number_of_trips', UserTypeCounts())
+    agg.add('func', DurationSummary())
+    agg.add('func2', UserTypeMeans())
+    results = agg.run(file)
+    n_trips, subscribers, customers = results['number_of_trips']
+    mean_duration, over_30 = results['func']
+    subscriber_mean, customer_mean = results['func2']
+    return {'n_trips': n_trips,
+            'proportion_of_subscribers': subscribers,
+            'proportion_of_customers': customers,
+            'average_trip_length': mean_duration,
+            'percent_longer_than_30': over_30,
+            'average_subscriber_trip': subscriber_mean,
+            'average_customer_trip': customer_mean}
+
+
+def plot_comparison(statistics, path):
+    """Bar charts comparing the statistics of every city."""
+    plt = _pyplot()
+    cities = list(statistics)
+    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
+    panels = [('n_trips', 'number of trips'),
+              ('proportion_of_subscribers', 'proportion of subscribers'),
+              ('percent_longer_than_30', '% of trips longer than 30 min')]
+    for ax, (key, title) in zip(axes, panels):
+        ax.bar(cities, [statistics[city][key] for city in cities])
+        ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def report_files(city_info, examples_dir='./examples'):
+    """
+    {city: summary file} for the cities of a city_info dictionary, plus the
+    Bay Area example summary when examples_dir holds it.
+    """
+    files = {city: filenames['out_file']
+             for city, filenames in city_info.items()}
+    example = os.path.join(examples_dir, 'BayArea-Y3-Summary.csv')
+    if os.path.exists(example):
+        files.setdefault('BayArea', example)
+    return files
+
+
+def _format(value):
+    # counts stay whole numbers, not 5e+04
+    if isinstance(value, int):
+        return str(value)
+    return '{:.4g}'.format(value)
+
+
+def _write_index(out_dir, statistics, figures):
+    path = os.path.join(out_dir, 'report.md')
+    columns = list(next(iter(statistics.values())))
+    with open(path, 'w') as f_out:
+        f_out.write('# Bike-share report\n\n')
+        f_out.write('| city | {} |\n'.format(' | '.join(columns)))
+        f_out.write('|---|{}\n'.format('---|' * len(columns)))
+        for city, values in statistics.items():
+            f_out.write('| {} | {} |\n'.format(city, ' | '.join(
+                _format(values[column]) for column in columns)))
+        for figure in figures:
+            f_out.write('\n![{0}]({0})\n'.format(os.path.basename(figure)))
+    return path
+
+
+def write_report(city_files, out_dir, fmt='png', workers=None):
+    """
+    Compute the statistics and draw every figure of each {city: summary
+    file} into out_dir, in fmt ('png', 'svg' or a sequence of both), using
+    a pool of workers processes (default: one per CPU). Then draw the
+    comparison of all cities and write report.md listing everything.
+    Returns the path of report.md.
+    """
+    formats = [fmt] if isinstance(fmt, str) else list(fmt)
+    os.makedirs(out_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        statistics = {city: pool.submit(city_statistics, file)
+                      for city, file in city_files.items()}
+        figures = [pool.submit(plot_figure, name, file, city, os.path.join(
+                       out_dir, '{}-{}.{}'.format(city, name, ext)))
+                   for city, file in city_files.items()
+                   for name in FIGURES for ext in formats]
+        statistics = {city: future.result()
+                      for city, future in statistics.items()}
+        figures += [pool.submit(plot_comparison, statistics, os.path.join(
+                        out_dir, 'comparison.{}'.format(ext)))
+                    for ext in formats]
+        figures = [future.result() for future in figures]
+
+    return _write_index(out_dir, statistics, figures)
@@ -0,0 +1,218 @@
+"""
+Registry of the raw trip file layouts of each bike-share system.
+
+Every system names and formats its columns differently. A CitySchema
+declares, for one system, where the trip duration is and in which unit,
+where the start time is and in which layout, and how its user types map to
+'Subscriber' / 'Customer'. Each schema is compiled once into a function that
+turns a raw csv row into a condensed (duration, month, hour, day_of_week,
+user_type) tuple, so condensing a file does not look at the city name again
+for every row.
+
+New systems are added by configuration rather than code, either in Python
+
+    register_schemas({'Boston': {'duration_column': 'tripduration', ...}})
+
+or from a JSON file holding the same dictionary (load_schemas, or the
+command line's --schemas option). The fields are those of CitySchema; a
+'file' entry names the system's raw file in the data directory.
+"""
+
+import json
+
+from .columnar import USER_TYPES
+from .timeparse import (date_parser, day_parser, split_format,
+                        start_time_parser, time_parser)
+
+# the systems the notebook analyses, and the Bay Area and Boston layouts
+DEFAULT_SCHEMAS = {
+    'NYC': {
+        'duration_column': 'tripduration', 'units_per_minute': 60,
+        'start_column': 'starttime', 'start_format': '%m/%d/%Y %H:%M:%S',
+        'user_type_column': 'usertype', 'station_column': 'start station id',
+        'file': 'NYC-CitiBike-2016.csv',
+    },
+    'Chicago': {
+        'duration_column': 'tripduration', 'units_per_minute': 60,
+        'start_column': 'starttime', 'start_format': '%m/%d/%Y %H:%M',
+        'user_type_column': 'usertype', 'station_column': 'from_station_id',
+        'file': 'Chicago-Divvy-2016.csv',
+    },
+    'Washington': {
+        'duration_column': 'Duration (ms)', 'units_per_minute': 60 * 1000,
+        'start_column': 'Start date', 'start_format': '%m/%d/%Y %H:%M',
+        'user_type_column': 'Member Type',
+        'user_types': {'Registered': 'Subscriber', 'Casual': 'Customer'},
+        'default_user_type': 'Customer',
+        'station_column': 'Start station number',
+        'file': 'Washington-CapitalBikeshare-2016.csv',
+    },
+    'BayArea': {
+        'duration_column': 'Duration', 'units_per_minute': 60,
+        'start_column': 'Start Date', 'start_format': '%m/%d/%Y %H:%M',
+        'user_type_column': 'Subscriber Type',
+        'station_column': 'Start Terminal',
+    },
+    'Boston': {
+        'duration_column': 'tripduration', 'units_per_minute': 60,
+        'start_column': 'starttime', 'start_format': '%Y-%m-%d %H:%M:%S',
+        'user_type_column': 'usertype', 'station_column': 'start station id',
+    },
+}
+
+# unknown cities are read like Washington, as the notebook's helpers did
+DEFAULT_CITY = 'Washington'
+
+SCHEMAS = {}
+
+
+class CitySchema:
+    """
+    Raw trip file layout of one system:
+
+        duration_column     trip duration, an integer
+        units_per_minute    duration units in a minute (60 for seconds)
+        start_column        trip start time
+        start_format        strptime layout of the start time; the time
+                            must follow the date and start with %H
+        user_type_column    type of the user who made the trip
+        user_types          raw user type -> 'Subscriber' / 'Customer'
+        default_user_type   user type of raw values not in user_types;
+                            None keeps them as they are
+        station_column      start station of the trip, if known
+        file                name of the raw file in the data directory
+    """
+
+    def __init__(self, name, duration_column, units_per_minute, start_column,
+                 start_format, user_type_column, user_types=None,
+                 default_user_type=None, station_column=None, file=None):
+        split_format(start_format)
+        self.name = name
+        self.duration_column = duration_column
+        self.units_per_minute = units_per_minute
+        self.start_column = start_column
+        self.start_format = start_format
+        self.user_type_column = user_type_column
+        self.user_types = dict(user_types or {})
+        self.default_user_type = default_user_type
+        self.station_column = station_column
+        self.file = file
+        self._compiled = {}
+
+    def __repr__(self):
+        return 'CitySchema({!r})'.format(self.name)
+
+    def __getstate__(self):
+        # compiled functions are rebuilt on demand, e.g. in worker processes
+        state = self.__dict__.copy()
+        state['_compiled'] = {}
+        return state
+
+    @property
+    def columns(self):
+        """The (duration, start time, user type) column names."""
+        return (self.duration_column, self.start_column, self.user_type_column)
+
+    def _compile(self, key, build):
+        try:
+            return self._compiled[key]
+        except KeyError:
+            function = self._compiled[key] = build()
+            return function
+
+    @property
+    def parse_start_time(self):
+        """Function from a start time string to (month, hour, day_of_week)."""
+        return self._compile('start', lambda: start_time_parser(
+            self.start_format))
+
+    @property
+    def parse_day(self):
+        """Function from a start time string to (ISO day, hour)."""
+        return self._compile('day', lambda: day_parser(self.start_format))
+
+    @property
+    def hours(self):
+        """Memo from the time part of a start time to its hour."""
+        return self._compile('hours', lambda: time_parser(
+            split_format(self.start_format)[1]))
+
+    @property
+    def parse_date(self):
+        """Function from the date part of a start time to (month, weekday)."""
+        return self._compile('date', lambda: date_parser(
+            split_format(self.start_format)[0]))
+
+    def user_type(self, value):
+        """Map one raw user type to 'Subscriber' / 'Customer'."""
+        if self.default_user_type is None:
+            return self.user_types.get(value, value)
+        return self.user_types.get(value, self.default_user_type)
+
+    @property
+    def known_user_types(self):
+        """
+        Raw user type -> 'Subscriber' / 'Customer' for the raw values this
+        system is known to write: those of user_types, and 'Subscriber' and
+        'Customer' themselves.
+        """
+        known = {user_type: user_type for user_type in USER_TYPES}
+        known.update(self.user_types)
+        return known
+
+    def row_converter(self, header, strict=False):
+        """
+        Compile a function that takes a raw csv row (a list of strings)
+        whose columns are named by header and returns the condensed
+        (duration, month, hour, day_of_week, user_type) tuple. Like
+        reader.row_converter, the function is a single generated expression.
+        If strict is True, a raw user type outside known_user_types raises
+        KeyError instead of being kept or given default_user_type.
+        """
+        duration, start, user = (header.index(column)
+                                 for column in self.columns)
+        if strict:
+            user_type = 'known[row[{}]]'.format(user)
+        elif self.user_types or self.default_user_type is not None:
+            user_type = 'user_type(row[{}])'.format(user)
+        else:
+            user_type = 'row[{}]'.format(user)
+        source = ('lambda row: (int(row[{}])/{!r},) + parse(row[{}]) + ({},)'
+                  .format(duration, self.units_per_minute, start, user_type))
+        return eval(source, {'parse': self.parse_start_time,
+                             'user_type': self.user_type,
+                             'known': self.known_user_types})
+
+
+def register(schema):
+    """Add a CitySchema to the registry, replacing one of the same name."""
+    SCHEMAS[schema.name] = schema
+    return schema
+
+
+def register_schemas(config):
+    """
+    Register a schema for every entry of a {name: {field: value}}
+    dictionary, as described in CitySchema.
+    """
+    return [register(CitySchema(name, **fields))
+            for name, fields in config.items()]
+
+
+def load_schemas(path):
+    """Register the schemas of a JSON file (see register_schemas)."""
+    with open(path, 'r') as f_in:
+        return register_schemas(json.load(f_in))
+
+
+def get_schema(city):
+    """
+    The schema of a city, or city itself if it already is a CitySchema.
+    Cities without a schema are read like Washington.
+    """
+    if isinstance(city, CitySchema):
+        return city
+    return SCHEMAS.get(city, SCHEMAS[DEFAULT_CITY])
+
+
+register_schemas(DEFAULT_SCHEMAS)
@@ -0,0 +1,85 @@
+"""
+Descriptive statistics of condensed summary files.
+
+These are the functions the notebook uses to answer its questions. Each one
+reads its file through an Aggregator (see bikeshare.aggregate), so it uses the
+summary's columnar cache or cube when there is an up-to-date one.
+"""
+
+from .aggregate import (Aggregator, UserTypeCounts, DurationSummary,
+                        UserTypeMeans, DurationList)
+from .columnar import TripTable
+
+# user types analysis() accepts besides 'all'
+_ANALYSIS_USER_TYPES = {'customer': 'Customer', 'subscriber': 'Subscriber'}
+
+
+def _single(file, stat):
+    agg = Aggregator()
+    agg.add('stat', stat)
+    agg.run(file)
+    return stat.result()
+
+
+def load_table(file):
+    """
+    Load every trip of a summary file into a compact TripTable (see
+    bikeshare.columnar), from its columnar cache if it is up to date.
+    """
+    return _single(file, TripTable())
+
+
+def number_of_trips(filename):
+    """
+    This function reads in a file with trip data and reports the number of
+    trips made, and the proportions made by subscribers and customers.
+    """
+    return _single(filename, UserTypeCounts())
+
+
+def func(file):
+    '''
+    this function takes a Bike-share system csv file as input and returns
+    the average trip length for each city and the proportion of rides
+    made in each city are longer than 30 minutes
+    '''
+    return _single(file, DurationSummary())
+
+
+def func2(file):
+    '''
+    this function takes a Bike-share system csv file as input and returns
+    the average trip duration of subscribers and of customers (nan for a
+    user type without trips; see duration_moments for their spread too)
+    '''
+    return _single(file, UserTypeMeans())
+
+
+def trip_times(file):
+    '''
+    this function takes a Bike-share system csv file as input and returns
+    the durations of the trips by users, for a histogram
+    '''
+    return _single(file, DurationList())
+
+
+def trip_times2(file, sub_or_cust):
+    '''
+    this function takes a Bike-share system csv file as input and returns
+    the durations of the trips by users (either 'Subscriber' or 'Customer')
+    '''
+    return load_table(file).filter(user_type=sub_or_cust).values('duration')
+
+
+def analysis(file, user_type='all'):
+    '''
+    this function takes a Bike-share system csv file and a type of users as
+    input and returns the month of every trip, for a histogram of the
+    ridership for each month (either 'all' users, 'subscriber' or 'customer')
+    '''
+    if user_type != 'all' and user_type not in _ANALYSIS_USER_TYPES:
+        raise ValueError('unknown user type: {}'.format(user_type))
+    table = load_table(file)
+    if user_type != 'all':
+        table = table.filter(user_type=_ANALYSIS_USER_TYPES[user_type])
+    return table.values('month')
@@ -0,0 +1,238 @@
+"""
+Indexed SQLite store of condensed trips.
+
+A summary CSV can only be scanned from start to end, whatever the
+question. condense_data(..., store=True) (or write_store for an existing
+summary) also loads the trips into ./data/NYC-2016-Summary.sqlite, with
+indexes on (month, user_type) and (day_of_week, hour), so filtered questions
+are answered by the database:
+
+    store = open_store('./data/NYC-2016-Summary.csv')
+    store.number_of_trips(month=7)
+    store.func(day_of_week=('Saturday', 'Sunday'), hour=range(18, 24))
+    store.month_counts(user_type='Customer')
+
+Every query takes the same filters: month, hour, day_of_week and user_type,
+each a single value or a sequence of accepted values. Statistics of a
+selection without trips are nan.
+"""
+
+import math
+import numbers
+import os
+import sqlite3
+
+from .columnar import is_fresh
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS trips (
+    duration REAL NOT NULL,
+    month INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    day_of_week TEXT NOT NULL,
+    user_type TEXT NOT NULL
+)'''
+
+_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS trips_month_user_type '
+    'ON trips (month, user_type)',
+    'CREATE INDEX IF NOT EXISTS trips_day_of_week_hour '
+    'ON trips (day_of_week, hour)',
+]
+
+_FILTERS = ('month', 'hour', 'day_of_week', 'user_type')
+
+
+def store_path(csv_file):
+    """Return the path of the SQLite store that belongs to a summary CSV."""
+    return os.path.splitext(csv_file)[0] + '.sqlite'
+
+
+def has_store(csv_file):
+    """True if the summary has an up-to-date store."""
+    return is_fresh(store_path(csv_file), csv_file)
+
+
+def _param(value):
+    # SQLite cannot bind NumPy integers
+    return int(value) if isinstance(value, numbers.Integral) else value
+
+
+def _where(filters):
+    """SQL WHERE clause and parameters for query filters."""
+    clauses = []
+    params = []
+    for name, value in filters.items():
+        if name not in _FILTERS:
+            raise TypeError('unknown filter: {}'.format(name))
+        if value is None:
+            continue
+        if isinstance(value, (str, numbers.Integral)):
+            clauses.append('{} = ?'.format(name))
+            params.append(_param(value))
+        else:
+            value = [_param(item) for item in value]
+            clauses.append('{} IN ({})'.format(
+                name, ', '.join('?' * len(value))))
+            params.extend(value)
+    if not clauses:
+        return '', params
+    return ' WHERE ' + ' AND '.join(clauses), params
+
+
+class StoreWriter:
+    """
+    Loads condensed trips into a new store, batch_size rows per executemany
+    call, all in one transaction, and indexes them when closed.
+    """
+
+    def __init__(self, path, batch_size=50000):
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = []
+        self.connection = sqlite3.connect(path)
+        # a store is rebuilt rather than repaired, so skip the journal
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(_SCHEMA)
+        self.connection.execute('BEGIN')
+
+    def append(self, duration, month, hour, day_of_week, user_type):
+        self.rows.append((duration, month, hour, day_of_week, user_type))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.connection.executemany(
+            'INSERT INTO trips VALUES (?, ?, ?, ?, ?)', self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        # indexing once at the end is cheaper than keeping them up to date
+        for index in _INDEXES:
+            self.connection.execute(index)
+        self.connection.commit()
+        self.connection.execute('ANALYZE')
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.connection.close()
+
+
+def write_store(csv_file, path=None):
+    """Build the store of an existing summary CSV and return its path."""
+    from .aggregate import read_summary_rows
+
+    if path is None:
+        path = store_path(csv_file)
+    with StoreWriter(path) as writer:
+        writer.extend(read_summary_rows(csv_file))
+    return path
+
+
+def open_store(csv_file):
+    """
+    Open the store of a summary CSV as a TripStore, building it first if
+    it is missing or older than the CSV.
+    """
+    if not has_store(csv_file):
+        write_store(csv_file)
+    return TripStore(store_path(csv_file))
+
+
+class TripStore:
+    """
+    Queries on a trip store. Each one mirrors a function of bikeshare.stats
+    on the trips matching the filters, computed by SQLite.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _query(self, select, filters, suffix=''):
+        where, params = _where(filters)
+        return self.connection.execute(
+            'SELECT {} FROM trips{}{}'.format(select, where, suffix), params)
+
+    def number_of_trips(self, **filters):
+        """
+        Number of trips and the proportions of subscribers and customers;
+        nan proportions without trips.
+        """
+        n_trips, n_subscribers = self._query(
+            "COUNT(*), TOTAL(user_type = 'Subscriber')", filters).fetchone()
+        if not n_trips:
+            return (0, math.nan, math.nan)
+        n_subscribers = int(n_subscribers)
+        return (n_trips, n_subscribers/n_trips,
+                (n_trips - n_subscribers)/n_trips)
+
+    def func(self, **filters):
+        """
+        Average trip length (truncated to whole minutes) and the percentage
+        of rides longer than 30 minutes; nan for both without trips.
+        """
+        n_trips, total, over_30 = self._query(
+            'COUNT(*), TOTAL(duration), TOTAL(duration > 30)',
+            filters).fetchone()
+        if not n_trips:
+            return (math.nan, math.nan)
+        return (int(total/n_trips), float(over_30*100/n_trips))
+
+    def func2(self, **filters):
+        """
+        Average trip duration of subscribers and of customers; nan for a
+        user type without trips.
+        """
+        filters.pop('user_type', None)
+        means = dict(self._query('user_type, AVG(duration)', filters,
+                                 ' GROUP BY user_type').fetchall())
+        return (means.get('Subscriber', math.nan),
+                means.get('Customer', math.nan))
+
+    def analysis(self, user_type='all', **filters):
+        """
+        The month of every trip, in file order, for 'all' users,
+        'subscriber' or 'customer'.
+        """
+        user_types = {'all': None, 'customer': 'Customer',
+                      'subscriber': 'Subscriber'}
+        if user_type not in user_types:
+            raise ValueError('unknown user type: {}'.format(user_type))
+        filters['user_type'] = user_types[user_type]
+        return [month for month, in self._query('month', filters,
+                                                 ' ORDER BY rowid')]
+
+    def month_counts(self, **filters):
+        """Number of trips in each month, as {month: count}."""
+        return dict(self._query('month, COUNT(*)', filters,
+                                ' GROUP BY month ORDER BY month'))
+
+    def trip_times(self, **filters):
+        """The duration of every trip, in file order."""
+        return [duration for duration, in self._query(
+            'duration', filters, ' ORDER BY rowid')]
@@ -0,0 +1,189 @@
+"""
+Fast parsing of trip start times.
+
+All three systems write start times as 'm/d/Y H:M' (Chicago, Washington) or
+'m/d/Y H:M:S' (NYC). Instead of datetime.strptime followed by strftime('%A')
+for every trip, the date and the time of day are split apart and each is
+looked up in a memo, since thousands of trips share the same date and the
+same time of day. Each new date or time is checked once against the same
+field patterns strptime uses for %m, %d, %Y, %H, %M and %S (so '0:5' is a
+time but '+1', '1_0' and two-digit years are not), and rejected with
+ValueError where strptime would reject it. The one difference is the
+separator: strptime takes any run of whitespace between the date and the
+time, these parsers split at the first space (so neither that nor a day
+written ' 1' gets through them). start_time_parser does the same for
+other date layouts, as long as the time of day follows the date and starts
+with the hour (see bikeshare.schema).
+"""
+
+import re
+from datetime import date, datetime
+
+from .columnar import DAYS_OF_WEEK
+
+# a year of dates per city is tiny, but don't let a long multi-year run grow
+# the memo without bound
+_MAX_MEMO_SIZE = 100000
+_date_memo = {}
+
+# the patterns of _strptime.TimeRE for %m/%d/%Y and %H:%M[:%S] (\d is any
+# Unicode decimal digit there too); %S allows 60 and 61 there, but datetime
+# then rejects them
+_MDY = re.compile(r'(1[0-2]|0[1-9]|[1-9])/(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])'
+                  r'/(\d\d\d\d)')
+_HM = r'(2[0-3]|[0-1]\d|\d):([0-5]\d|\d)'
+_TIMES = {
+    (2,): re.compile(_HM),
+    (3,): re.compile(_HM + r':([0-5]\d|\d)'),
+    (2, 3): re.compile(_HM + r'(?::([0-5]\d|\d))?'),
+}
+
+
+def _check_hour(time_part, n_fields):
+    """
+    The hour of an 'H:M' or 'H:M:S' time of day, with n_fields a tuple of
+    the accepted numbers of fields. Raises ValueError unless each field
+    matches what strptime's %H, %M and %S accept.
+    """
+    found = _TIMES[n_fields].fullmatch(time_part)
+    if found is None:
+        raise ValueError('time data {!r} is not a valid time of day'.format(
+            time_part))
+    return int(found.group(1))
+
+
+class _Hours(dict):
+    """Hour of each time of day seen so far, parsed and checked once."""
+
+    def __init__(self, parse):
+        super().__init__()
+        self.parse = parse
+
+    def __missing__(self, time_part):
+        hour = self.parse(time_part)
+        if len(self) >= _MAX_MEMO_SIZE:
+            self.clear()
+        self[time_part] = hour
+        return hour
+
+
+def time_parser(time_format):
+    """
+    Return a memo of the hour of times of day in the strptime layout
+    time_format: hours[time_part] gives the hour, or raises ValueError.
+    """
+    if time_format in ('%H:%M', '%H:%M:%S'):
+        n_fields = (time_format.count(':') + 1,)
+        return _Hours(lambda time_part: _check_hour(time_part, n_fields))
+    return _Hours(lambda time_part: datetime.strptime(
+        time_part, time_format).hour)
+
+
+# hours of parse_start_time, which takes both layouts
+HOURS = _Hours(lambda time_part: _check_hour(time_part, (2, 3)))
+
+
+def month_and_weekday(date_part):
+    """
+    Return (month, weekday name) for an 'm/d/Y' string, memoised per date.
+    """
+    try:
+        return _date_memo[date_part]
+    except KeyError:
+        pass
+    found = _MDY.fullmatch(date_part)
+    if found is None:
+        raise ValueError('time data {!r} does not match format {!r}'.format(
+            date_part, '%m/%d/%Y'))
+    month, day, year = map(int, found.groups())
+    result = (month, DAYS_OF_WEEK[date(year, month, day).weekday()])
+    if len(_date_memo) >= _MAX_MEMO_SIZE:
+        _date_memo.clear()
+    _date_memo[date_part] = result
+    return result
+
+
+def parse_start_time(value):
+    """
+    Takes a start time string in one of the 'm/d/Y H:M[:S]' layouts and
+    returns the month, hour and day of the week, exactly like
+    datetime.strptime(...) followed by .month, .hour and .strftime('%A').
+    """
+    date_part, _, time_part = value.partition(' ')
+    month, day_of_week = month_and_weekday(date_part)
+    return (month, HOURS[time_part], day_of_week)
+
+
+def date_parser(date_format):
+    """
+    Return a function that takes a date string in the strptime layout
+    date_format and returns (month, weekday name), memoised per date.
+    """
+    if date_format == '%m/%d/%Y':
+        return month_and_weekday
+    memo = {}
+
+    def parse_date(date_part):
+        try:
+            return memo[date_part]
+        except KeyError:
+            pass
+        day = datetime.strptime(date_part, date_format)
+        result = (day.month, DAYS_OF_WEEK[day.weekday()])
+        if len(memo) >= _MAX_MEMO_SIZE:
+            memo.clear()
+        memo[date_part] = result
+        return result
+    return parse_date
+
+
+def day_parser(start_format):
+    """
+    Return a function that takes a start time in the strptime layout
+    start_format and returns its day as an ISO 'Y-m-d' string (which sorts
+    by date) and its hour, with each date converted once.
+    """
+    date_format, time_format = split_format(start_format)
+    hours = time_parser(time_format)
+    memo = {}
+
+    def parse(value):
+        date_part, _, time_part = value.partition(' ')
+        try:
+            day = memo[date_part]
+        except KeyError:
+            if len(memo) >= _MAX_MEMO_SIZE:
+                memo.clear()
+            day = memo[date_part] = datetime.strptime(
+                date_part, date_format).date().isoformat()
+        return day, hours[time_part]
+    return parse
+
+
+def split_format(start_format):
+    """
+    Split a start time layout such as '%Y-%m-%d %H:%M:%S' into its date and
+    time layouts. Raises ValueError unless a space separates the two and the
+    time starts with the hour, which is what the fast parsers rely on.
+    """
+    date_format, _, time_format = start_format.partition(' ')
+    if not time_format.startswith('%H:'):
+        raise ValueError('start time layout must be a date, a space and a time '
+                         'starting with %H: {!r}'.format(start_format))
+    return date_format, time_format
+
+
+def start_time_parser(start_format):
+    """
+    Return a function like parse_start_time for start times in the strptime
+    layout start_format.
+    """
+    date_format, time_format = split_format(start_format)
+    parse_date = date_parser(date_format)
+    hours = time_parser(time_format)
+
+    def parse(value):
+        date_part, _, time_part = value.partition(' ')
+        month, day_of_week = parse_date(date_part)
+        return (month, hours[time_part], day_of_week)
+    return parse
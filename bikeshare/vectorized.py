@@ -0,0 +1,232 @@
+"""
+Batch (vectorised) version of condense_data.
+
+Rows are read in chunks, the columns each city needs are pulled out into
+NumPy arrays, and durations, start times and user types are converted a whole
+chunk at a time instead of calling duration_in_mins, time_of_trip and
+type_of_user once per row. The CSV written is byte-for-byte the same as the
+one condense_data writes, and bad rows can be quarantined the same way (see
+bikeshare.quarantine).
+"""
+
+import csv
+import numpy as np
+
+from .cache import invalidate
+from .columnar import ColumnarWriter, columnar_path
+from .compression import open_text
+from .cube import build_cube
+from .quarantine import Quarantine, quarantine_path
+from .reader import read_columns, row_converter, skip_blank
+from .schema import get_schema
+from .timeparse import HOURS, month_and_weekday
+from .wrangling import OUT_COLNAMES, ROW_ERRORS, condense_checked, read_chunk
+
+
+def _read_chunks(rows, chunk_size):
+    """Yield lists of at most chunk_size rows from an iterator."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def durations_in_mins(values, units_per_minute):
+    """Convert an array of integer duration strings to minutes."""
+    return np.array(values, dtype=np.int64) / units_per_minute
+
+
+def times_of_trips(values, parse_date=month_and_weekday, hours=HOURS):
+    """
+    Parse an array of 'm/d/Y H:M' or 'm/d/Y H:M:S' start times (or of
+    another layout, given its parse_date function and hours memo) and
+    return arrays of months, hours and weekday names. Each distinct date is
+    only converted to a weekday once, and each distinct time of day checked
+    and converted to an hour once (see bikeshare.timeparse).
+    """
+    parts = np.char.partition(np.array(values), ' ')
+    dates, date_index = np.unique(parts[:, 0], return_inverse=True)
+
+    months = np.empty(len(dates), dtype=np.int64)
+    day_names = []
+    for i, day in enumerate(dates.tolist()):
+        months[i], day_name = parse_date(day)
+        day_names.append(day_name)
+
+    times, time_index = np.unique(parts[:, 2], return_inverse=True)
+    hours = np.array([hours[time] for time in times.tolist()],
+                     dtype=np.int64)
+    day_names = np.array(day_names)
+    return months[date_index], hours[time_index], day_names[date_index]
+
+
+def types_of_users(values, city, strict=False):
+    """
+    Map an array of raw user types to 'Subscriber' / 'Customer'. If strict
+    is True, a user type the city's schema does not know raises KeyError,
+    as schema.row_converter(..., strict=True) does.
+    """
+    schema = get_schema(city)
+    values = np.array(values)
+    if strict:
+        known = schema.known_user_types
+        names, index = np.unique(values, return_inverse=True)
+        return np.array([known[name] for name in names.tolist()])[index]
+    if not schema.user_types and schema.default_user_type is None:
+        return values
+    # map each distinct raw value once
+    names, index = np.unique(values, return_inverse=True)
+    return np.array([schema.user_type(name) for name in names.tolist()])[index]
+
+
+def read_trip_columns(f, city, header=None):
+    """
+    Yield (duration, start time, user type) string tuples from an open raw
+    trip file of the given city; header as for read_columns.
+    """
+    return read_columns(f, get_schema(city).columns, header=header)
+
+
+def condense_chunk(chunk, city, stats=None, strict=False):
+    """
+    Convert a list of raw (duration, start time, user type) tuples to
+    condensed (duration, month, hour, day_of_week, user_type) tuples,
+    timing each step as a stage of stats if given. strict is passed on to
+    types_of_users.
+    """
+    schema = get_schema(city)
+    durations, starts, user_types = zip(*chunk)
+    if stats is not None:
+        stats.lap('read')
+    duration = durations_in_mins(durations, schema.units_per_minute)
+    if stats is not None:
+        stats.lap('duration')
+    month, hour, day_of_week = times_of_trips(starts, schema.parse_date,
+                                               schema.hours)
+    if stats is not None:
+        stats.lap('start_time')
+    user_type = types_of_users(user_types, schema, strict)
+    if stats is not None:
+        stats.lap('user_type')
+
+    # tolist() gives back plain Python numbers and strings, which the csv
+    # module formats exactly like the per-row version does
+    rows = list(zip(duration.tolist(), month.tolist(), hour.tolist(),
+                    day_of_week.tolist(), user_type.tolist()))
+    if stats is not None:
+        stats.lap('to_rows')
+    return rows
+
+
+def condense_rows(trips, trip_writer, city, chunk_size=100000, columns=None,
+                  stats=None):
+    """
+    Condense raw (duration, start time, user type) tuples chunk_size at a
+    time and write the results with a csv writer (and to a ColumnarWriter,
+    if given), timing each step as a stage of stats if given.
+    """
+    if stats is not None:
+        stats.lap()
+    for chunk in _read_chunks(trips, chunk_size):
+        rows = condense_chunk(chunk, city, stats)
+        trip_writer.writerows(rows)
+        if stats is not None:
+            stats.lap('write')
+            stats.rows += len(rows)
+        if columns is not None:
+            for row in rows:
+                columns.append(*row)
+            if stats is not None:
+                stats.lap('columnar')
+
+
+def condense_quarantined(f_in, trip_writer, city, quarantine, header=None,
+                         chunk_size=100000, columns=None, stats=None):
+    """
+    condense_rows for the raw rows of an open trip file (header as for
+    read_columns), writing the rows that cannot be condensed to a
+    Quarantine instead of raising. Chunks are converted whole as before;
+    a chunk holding a bad row is done again one row at a time, with the
+    strict row converter of condense_data. Returns the number of lines
+    read, for quarantine.check.
+    """
+    schema = get_schema(city)
+    trip_reader = csv.reader(f_in)
+    if header is None:
+        header = next(trip_reader)
+    rows = skip_blank(trip_reader)
+    project = row_converter([header.index(column)
+                             for column in schema.columns])
+    condense_row = schema.row_converter(header, strict=True)
+    if stats is not None:
+        stats.lap()
+    while True:
+        chunk, lines = read_chunk(rows, trip_reader, chunk_size, schema,
+                                  header, quarantine)
+        if not chunk:
+            return trip_reader.line_num
+        done = len(columns) if columns is not None else 0
+        try:
+            points = condense_chunk([project(row) for row in chunk], schema,
+                                    stats, strict=True)
+            # the columnar copy goes first, as in condense_data
+            if columns is not None:
+                for point in points:
+                    columns.append(*point)
+        except ROW_ERRORS:
+            if columns is not None:
+                columns.truncate(done)
+            points = condense_checked(chunk, lines, schema, header,
+                                      condense_row, columns, quarantine)
+            if stats is not None:
+                stats.lap('quarantine')
+        trip_writer.writerows(points)
+        if stats is not None:
+            stats.lap('write')
+            stats.rows += len(points)
+
+
+def condense_data_batch(in_file, out_file, city, chunk_size=100000,
+                        columnar=False, cube=False, stats=None,
+                        quarantine=None):
+    """
+    Same as condense_data(), but converts chunk_size rows at a time with
+    NumPy. If columnar is True the columnar cache is written as well, and if
+    cube is True the summary's cube (see bikeshare.cube) is built after it.
+    stats, a PipelineStats, records the time of every step. quarantine is
+    as for condense_data, and the Quarantine is returned if given.
+    """
+    if quarantine is not None and not isinstance(quarantine, Quarantine):
+        quarantine = Quarantine(quarantine_path(out_file)
+                                if quarantine is True else quarantine)
+    columns = ColumnarWriter(columnar_path(out_file)) if columnar else None
+
+    with open_text(out_file, 'w') as f_out, open_text(in_file) as f_in:
+        trip_writer = csv.writer(f_out)
+        trip_writer.writerow(OUT_COLNAMES)
+
+        if quarantine is None:
+            condense_rows(read_trip_columns(f_in, city), trip_writer, city,
+                          chunk_size, columns, stats)
+        else:
+            n_lines = condense_quarantined(f_in, trip_writer, city,
+                                           quarantine, None, chunk_size,
+                                           columns, stats)
+            quarantine.check(n_lines - 1)
+
+    if columns is not None:
+        columns.close()
+    if cube:
+        build_cube(out_file)
+        if stats is not None:
+            stats.lap('cube')
+    invalidate(out_file)
+    if stats is not None:
+        stats.finish(in_file, out_file)
+    if quarantine is not None:
+        quarantine.close()
+        return quarantine
@@ -0,0 +1,281 @@
+"""
+Reading the raw trip files and condensing them to five columns per trip.
+
+The raw files of each system name and format their columns differently, as
+declared by its schema (see bikeshare.schema). The helpers below turn a raw
+trip into its duration in minutes, start month, hour and day of the week,
+and a 'Subscriber' / 'Customer' user type, and condense_data writes those
+for every trip of a file. Both raw and condensed
+files may be compressed (see bikeshare.compression). The notebook explains
+each step; bikeshare.vectorized and bikeshare.parallel write the same output
+faster.
+"""
+
+import csv
+from itertools import islice
+
+from .cache import invalidate
+from .columnar import ColumnarWriter, columnar_path
+from .compression import compression_of, open_text
+from .mapped import first_record
+from .quarantine import Quarantine, diagnose, quarantine_path
+from .reader import skip_blank
+from .schema import get_schema
+
+OUT_COLNAMES = ['duration', 'month', 'hour', 'day_of_week', 'user_type']
+
+# rows converted and written at a time when condense_data is timed
+TIMED_CHUNK = 10000
+
+# what converting a bad raw row, or storing what it converts to, raises
+ROW_ERRORS = (ValueError, IndexError, KeyError, ArithmeticError, TypeError)
+
+
+def print_first_point(filename):
+    """
+    This function prints and returns the first data point (second row) from
+    a csv file that includes a header row.
+    """
+    from pprint import pprint
+
+    # print city name for reference
+    city = filename.split('-')[0].split('/')[-1]
+    print('\nCity: {}'.format(city))
+
+    if compression_of(filename):
+        with open_text(filename) as f_in:
+            trip_reader = csv.DictReader(f_in)
+            first_trip = next(trip_reader)
+    else:
+        # only the first two lines are read, however large the file
+        first_trip = first_record(filename)
+    pprint(first_trip)
+    # output city name and first trip for later testing
+    return (city, first_trip)
+
+
+def duration_in_mins(datum, city):
+    """
+    Takes as input a dictionary containing info about a single trip (datum) and
+    its origin city (city) and returns the trip duration in units of minutes.
+
+    Washington is in terms of milliseconds while Chicago and NYC are in terms
+    of seconds; each city's schema holds its column and unit.
+    """
+    schema = get_schema(city)
+    duration = int(datum[schema.duration_column])/schema.units_per_minute
+
+    return duration
+
+
+def time_of_trip(datum, city):
+    """
+    Takes as input a dictionary containing info about a single trip (datum) and
+    its origin city (city) and returns the month, hour, and day of the week in
+    which the trip was made.
+
+    NYC includes seconds, while Washington and Chicago do not. The start
+    time fields are sliced out by the schema's parser, which gives the same
+    result as datetime.strptime for its layout but is much faster (see
+    benchmarks/time_of_trip.py).
+    """
+    schema = get_schema(city)
+    return schema.parse_start_time(datum[schema.start_column])
+
+
+def type_of_user(datum, city):
+    """
+    Takes as input a dictionary containing info about a single trip (datum) and
+    its origin city (city) and returns the type of system user that made the
+    trip.
+
+    Washington has different category names compared to Chicago and NYC,
+    which its schema maps to theirs.
+    """
+    schema = get_schema(city)
+    user_type = schema.user_type(datum[schema.user_type_column])
+
+    return user_type
+
+
+def _reject(quarantine, line, schema, header, row, error):
+    """
+    Quarantine the row ending on line that raised error, or raise it
+    without a quarantine.
+    """
+    if quarantine is None:
+        raise error
+    quarantine.reject(line, row, diagnose(schema, header, row, error),
+                      line - 1)
+
+
+def _condense_rows(rows, trip_reader, schema, header, condense_row,
+                   trip_writer, columns, trips, quarantine):
+    """The row loop of condense_data, over the rows of trip_reader."""
+    # a bad row leaves the loop, and it starts again on the next row once
+    # the row is quarantined
+    while True:
+        try:
+            for row in rows:
+                new_point = condense_row(row)
+
+                # the columnar copy goes first: a trip it cannot hold raises
+                # before anything of it is written
+                if columns is not None:
+                    columns.append(*new_point)
+                if trips is not None:
+                    trips.append(*new_point)
+                trip_writer.writerow(new_point)
+        except csv.Error as error:
+            _reject(quarantine, trip_reader.line_num, schema, header, None,
+                    error)
+        except ROW_ERRORS as error:
+            _reject(quarantine, trip_reader.line_num, schema, header, row,
+                    error)
+        else:
+            return
+
+
+def read_chunk(rows, trip_reader, size, schema, header, quarantine):
+    """
+    Up to size rows of trip_reader and the line each of them ends on,
+    quarantining the rows the csv module cannot read.
+    """
+    chunk = []
+    lines = []
+    while True:
+        try:
+            for row in islice(rows, size - len(chunk)):
+                chunk.append(row)
+                lines.append(trip_reader.line_num)
+            return chunk, lines
+        except csv.Error as error:
+            _reject(quarantine, trip_reader.line_num, schema, header, None,
+                    error)
+
+
+def condense_checked(chunk, lines, schema, header, condense_row, columns,
+                     quarantine):
+    """
+    Convert a chunk of rows one at a time, with the columnar copy if any,
+    quarantining the rows that fail; returns the converted trips.
+    """
+    points = []
+    for row, line in zip(chunk, lines):
+        try:
+            point = condense_row(row)
+            if columns is not None:
+                columns.append(*point)
+        except ROW_ERRORS as error:
+            _reject(quarantine, line, schema, header, row, error)
+        else:
+            points.append(point)
+    return points
+
+
+def _condense_timed(rows, trip_reader, schema, header, condense_row,
+                    trip_writer, columns, trips, quarantine, stats,
+                    chunk_size=TIMED_CHUNK):
+    """
+    The work of _condense_rows done chunk_size rows at a time, each step
+    for a whole chunk and timed as a stage of stats (see
+    bikeshare.instrument). Rows go through the same compiled converter; the
+    rows of a chunk holding a bad one are done again one at a time, so that
+    it can be quarantined.
+    """
+    lap = stats.lap
+    lap()
+    while True:
+        chunk, lines = read_chunk(rows, trip_reader, chunk_size, schema,
+                                  header, quarantine)
+        lap('read')
+        if not chunk:
+            return
+        done = len(columns) if columns is not None else 0
+        try:
+            points = [condense_row(row) for row in chunk]
+            lap('convert')
+            if columns is not None:
+                for point in points:
+                    columns.append(*point)
+                lap('columnar')
+        except ROW_ERRORS:
+            if quarantine is None:
+                raise
+            if columns is not None:
+                columns.truncate(done)
+            points = condense_checked(chunk, lines, schema, header,
+                                      condense_row, columns, quarantine)
+            lap('quarantine')
+        if trips is not None:
+            trips.extend(points)
+            lap('store')
+        trip_writer.writerows(points)
+        lap('write')
+        stats.rows += len(points)
+
+
+def condense_data(in_file, out_file, city, columnar=False, store=False,
+                  stats=None, quarantine=None):
+    """
+    This function takes full data from the specified input file
+    and writes the condensed data to a specified output file. The city
+    argument determines how the input file will be parsed. If columnar is
+    True, the condensed trips are also saved as typed arrays next to the
+    output file (see bikeshare.columnar), which later analysis reads instead
+    of the CSV. If store is True, they are also loaded into an indexed
+    SQLite store (see bikeshare.store). If stats is a PipelineStats, the
+    time of every step is recorded in it (see bikeshare.instrument).
+
+    A bad row (an empty duration, a malformed start time...) raises, unless
+    quarantine is given: a Quarantine, True for one writing to
+    quarantine_path(out_file), or the path of its side file. Bad rows and
+    unexpected user types are then written to it and skipped (see
+    bikeshare.quarantine), and the Quarantine is returned.
+    """
+    if quarantine is not None and not isinstance(quarantine, Quarantine):
+        quarantine = Quarantine(quarantine_path(out_file)
+                                if quarantine is True else quarantine)
+    columns = ColumnarWriter(columnar_path(out_file)) if columnar else None
+    trips = None
+    if store:
+        from .store import StoreWriter, store_path
+        trips = StoreWriter(store_path(out_file))
+    with open_text(out_file, 'w') as f_out, open_text(in_file) as f_in:
+        # set up csv writer object and write the column names as first row
+        trip_writer = csv.writer(f_out)
+        trip_writer.writerow(OUT_COLNAMES)
+
+        # the city's schema compiles the work of the three helper functions
+        # into one function of a raw row, for the columns of this file
+        trip_reader = csv.reader(f_in)
+        header = next(trip_reader)
+        rows = skip_blank(trip_reader)
+
+        schema = get_schema(city)
+        condense_row = schema.row_converter(header,
+                                            strict=quarantine is not None)
+
+        # collect data from and process each row
+        if stats is None:
+            _condense_rows(rows, trip_reader, schema, header, condense_row,
+                           trip_writer, columns, trips, quarantine)
+        else:
+            _condense_timed(rows, trip_reader, schema, header, condense_row,
+                            trip_writer, columns, trips, quarantine, stats)
+
+        if quarantine is not None:
+            quarantine.check(trip_reader.line_num - 1)
+
+    # save the columnar copy and the store after the csv so that they are
+    # the more recent files
+    if columns is not None:
+        columns.close()
+    if trips is not None:
+        trips.close()
+    invalidate(out_file)
+    if stats is not None:
+        stats.finish(in_file, out_file)
+    if quarantine is not None:
+        quarantine.close()
+        return quarantine
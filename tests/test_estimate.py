@@ -0,0 +1,43 @@
+import math
+
+import pytest
+
+from bikeshare.estimate import count_trips, estimate_trips
+from bikeshare.mapped import count_rows
+from bikeshare.stats import func, number_of_trips
+
+ROWS = [
+    '12.5,1,8,Friday,Subscriber',
+    '40.25,7,17,Sunday,Customer',
+    '3.0,12,23,Monday,Subscriber',
+]
+
+
+def write_summary(path, lines, end):
+    with open(path, 'w', newline='') as f_out:
+        f_out.write(end.join(lines))
+
+
+@pytest.mark.parametrize('end', ['\r\n', '\n'])
+@pytest.mark.parametrize('tail', [
+    [''],                       # a trailing line break
+    ['', ''],                   # and a blank line after it
+    ['', '', ''],
+    [],                         # no final line break
+])
+def test_blank_lines_are_not_trips(tmp_path, end, tail):
+    path = str(tmp_path / 'summary.csv')
+    header = 'duration,month,hour,day_of_week,user_type'
+    write_summary(path, [header, ROWS[0], '', ROWS[1], ROWS[2]] + tail, end)
+
+    assert number_of_trips(path) == (3, 2 / 3, 1 / 3)
+    assert count_trips(path) == number_of_trips(path)
+    assert count_rows(path) == 3
+
+    estimate = estimate_trips(path, fraction=1.0)
+    assert estimate['rows_sampled'] == 3
+    assert estimate['proportion_of_subscribers'].value == 2 / 3
+    assert math.isclose(estimate['average_trip_length'].value,
+                        (12.5 + 40.25 + 3.0) / 3)
+    assert estimate['percent_longer_than_30'].value == pytest.approx(
+        func(path)[1])
@@ -0,0 +1,29 @@
+import math
+import random
+
+from bikeshare.external import group_by
+
+
+def test_station_keys_sort_numerically():
+    records = [((station, 'Subscriber'), 1.0)
+               for station in ('519', '72', '3002', '72', 'TA1307', '8')]
+    keys = [key for key, _ in group_by(records)]
+    assert keys == [('8', 'Subscriber'), ('72', 'Subscriber'),
+                    ('519', 'Subscriber'), ('3002', 'Subscriber'),
+                    ('TA1307', 'Subscriber')]
+
+
+def test_totals_are_exact_however_runs_are_spilled(tmp_path):
+    rng = random.Random(0)
+    records = [((str(rng.randrange(300)),), rng.randrange(60, 10 ** 6) / 60)
+               for _ in range(20000)]
+    exact = {}
+    for key, value in records:
+        exact.setdefault(key, []).append(value)
+
+    in_memory = dict(group_by(records))
+    spilled = dict(group_by(records, memory_mb=0.01, tmp_dir=str(tmp_path)))
+    assert in_memory.keys() == spilled.keys() == exact.keys()
+    for key, values in exact.items():
+        assert in_memory[key].total == spilled[key].total == math.fsum(values)
+        assert in_memory[key].n == spilled[key].n == len(values)
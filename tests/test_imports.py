@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+_PROBE = '''
+import sys
+from bikeshare import {}
+print({}({!r}))
+print('numpy' in sys.modules)
+'''
+
+
+@pytest.mark.parametrize('function', ['number_of_trips', 'func', 'func2'])
+def test_stats_of_a_plain_csv_leave_numpy_unimported(tmp_path, function):
+    path = tmp_path / 'summary.csv'
+    path.write_text('duration,month,hour,day_of_week,user_type\n'
+                    '12.5,1,8,Friday,Subscriber\n'
+                    '40.25,7,17,Sunday,Customer\n')
+    output = subprocess.check_output(
+        [sys.executable, '-c', _PROBE.format(function, function, str(path))],
+        cwd=ROOT, universal_newlines=True)
+    assert output.splitlines()[-1] == 'False'
@@ -0,0 +1,30 @@
+import pytest
+
+from bikeshare.ingest import city_of, ingest
+
+HEADER = ('tripduration,starttime,stoptime,start station id,'
+          'start station name,start station latitude,start station longitude,'
+          'end station id,end station name,end station latitude,'
+          'end station longitude,bikeid,usertype,birth year,gender')
+ROW = '634,1/1/2016 00:00:00,x,1,a,0,0,2,b,0,0,3,Subscriber,1970,1'
+
+
+def test_unknown_cities_are_refused():
+    assert city_of('data/NYC-2016-01.csv') == 'NYC'
+    assert city_of('data/citibike-01.csv', 'NYC') == 'NYC'
+    with pytest.raises(ValueError):
+        city_of('data/citibike-01.csv')
+    with pytest.raises(ValueError):
+        city_of('data/NYC-2016-01.csv', 'Gotham')
+
+
+@pytest.mark.parametrize('end', ['\n', '\r\n'])
+def test_progress_counts_bytes(tmp_path, end):
+    in_file = tmp_path / 'citibike-01.csv'
+    in_file.write_bytes(end.join([HEADER] + [ROW] * 50 + ['']).encode())
+    report, = ingest([str(in_file)], city='NYC', chunk_bytes=200,
+                     progress=lambda report: None)
+    assert report.rows == 50
+    assert report.bytes == 50 * len(ROW + end)
+    with open(tmp_path / 'citibike-01-Summary.csv') as f_in:
+        assert len(f_in.read().splitlines()) == 51
@@ -0,0 +1,56 @@
+import numpy as np
+
+from bikeshare.columnar import columnar_path, cube_path
+from bikeshare.manifest import condense_incremental
+from bikeshare.parallel import condense_parallel
+
+HEADER = ('tripduration,starttime,stoptime,start station id,'
+          'start station name,start station latitude,start station longitude,'
+          'end station id,end station name,end station latitude,'
+          'end station longitude,bikeid,usertype,birth year,gender\n')
+
+
+def trips(first, last):
+    return ''.join(
+        '{},{}/{}/2016 {}:{:02d}:00,x,1,a,0,0,2,b,0,0,3,{},1980,1\n'.format(
+            60 + 97 * i % 3000, 1 + i % 12, 1 + i % 28, i % 24, i % 60,
+            'Customer' if i % 5 == 0 else 'Subscriber')
+        for i in range(first, last))
+
+
+def arrays(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def assert_same_outputs(out_file, ref_file):
+    with open(out_file, 'rb') as f_out, open(ref_file, 'rb') as f_ref:
+        assert f_out.read() == f_ref.read()
+    for path in (columnar_path, cube_path):
+        out, ref = arrays(path(out_file)), arrays(path(ref_file))
+        assert out.keys() == ref.keys()
+        for name in out:
+            assert np.array_equal(out[name], ref[name])
+
+
+def test_appended_trips_extend_the_cache_and_cube(tmp_path):
+    in_file, out_file = str(tmp_path / 'in.csv'), str(tmp_path / 'out.csv')
+    ref_in, ref_file = str(tmp_path / 'ref.csv'), str(tmp_path / 'ref-out.csv')
+    with open(ref_in, 'w') as f_out:
+        f_out.write(HEADER + trips(0, 500))
+    condense_incremental(ref_in, ref_file, 'NYC', columnar=True, cube=True)
+
+    with open(in_file, 'w') as f_out:
+        f_out.write(HEADER + trips(0, 300))
+    assert condense_incremental(in_file, out_file, 'NYC', columnar=True,
+                                cube=True) == 'full'
+    with open(in_file, 'a') as f_out:
+        f_out.write(trips(300, 400))
+    assert condense_incremental(in_file, out_file, 'NYC', columnar=True,
+                                cube=True) == 'append'
+    with open(in_file, 'a') as f_out:
+        f_out.write(trips(400, 500))
+    city_info = {'NYC': {'in_file': in_file, 'out_file': out_file}}
+    assert condense_parallel(city_info, workers=2, columnar=True,
+                             incremental=True, cube=True) == {'NYC': 'append'}
+    assert_same_outputs(out_file, ref_file)
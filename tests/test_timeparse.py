@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from bikeshare.timeparse import (date_parser, parse_start_time,
+                                 start_time_parser, time_parser)
+
+DATES = [
+    '1/1/2016', '01/01/2016', '12/31/2016', '2/29/2016', '2/29/2015',
+    '1/ 1/2016', '13/1/2016', '0/1/2016', '1/0/2016', '1/32/2016',
+    '+1/1/2016', '1/1/+2016', '1_0/1/2016', '1/1/2_016', '1/1/16',
+    '1/1/02016', ' 1/1/2016', '1/1/2016 ', '1/1', '١/1/2016',
+]
+TIMES = [
+    '0:05', '0:5', '00:00', '23:59', '24:00', '7:60', '007:05', '+1:05',
+    '1_0:05', '1:+5', ' 1:05', '1:05 ', '1:05:', '1:05:5', '1:05:60', '1:05:61',
+    '1:05:62', '1:05:007', '1:05:+1', '1:05:00:00', '١:05',
+]
+
+
+def strptime_or_error(value, layout):
+    try:
+        return datetime.strptime(value, layout)
+    except ValueError:
+        return None
+
+
+def parse_or_error(parse, value):
+    try:
+        return parse(value)
+    except ValueError:
+        return None
+
+
+# strptime takes any run of whitespace between the date and the time (and
+# ' 1' as a day), the fast parsers split on the first space
+@pytest.mark.parametrize('date_part', [d for d in DATES if ' ' not in d])
+@pytest.mark.parametrize('time_part', [t for t in TIMES if ' ' not in t])
+def test_start_times_match_strptime(date_part, time_part):
+    value = date_part + ' ' + time_part
+    for layout in ('%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S'):
+        expected = strptime_or_error(value, layout)
+        if expected is not None:
+            expected = (expected.month, expected.hour,
+                        expected.strftime('%A'))
+        assert parse_or_error(start_time_parser(layout), value) == expected
+
+    expected = [strptime_or_error(value, layout) for layout in
+                ('%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S')]
+    expected = next((day for day in expected if day is not None), None)
+    if expected is not None:
+        expected = (expected.month, expected.hour, expected.strftime('%A'))
+    assert parse_or_error(parse_start_time, value) == expected
+
+
+def test_dates_match_strptime():
+    parse_date = date_parser('%m/%d/%Y')
+    for date_part in DATES:
+        expected = strptime_or_error(date_part, '%m/%d/%Y')
+        if expected is not None:
+            expected = (expected.month, expected.strftime('%A'))
+        assert parse_or_error(parse_date, date_part) == expected
+
+
+@pytest.mark.parametrize('layout', ['%H:%M', '%H:%M:%S'])
+def test_times_of_day_match_strptime(layout):
+    hours = time_parser(layout)
+    for time_part in TIMES:
+        expected = strptime_or_error(time_part, layout)
+        assert parse_or_error(hours.__getitem__, time_part) == (
+            None if expected is None else expected.hour)